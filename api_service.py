@@ -5,24 +5,94 @@ HTML to Markdown Web API Service
 """
 
 from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, HttpUrl, Field
+from typing import Optional, Callable, List, TYPE_CHECKING
 import os
+import asyncio
+import functools
 import tempfile
+import multiprocessing
+import json
+from collections import OrderedDict, defaultdict, deque
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import time
 import hashlib
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
+from contextlib import contextmanager
+import threading
 import uuid
 
-from html2md import HTML2Markdown
-from supabase import create_client, Client
+from html2md import HTML2Markdown, create_session, convert_url as convert_url_to_dir
+from html2md_net import (
+    DEFAULT_RATE_LIMITS, RetryPolicy, canonicalize_url, get_host_concurrency, parse_rate_limits,
+    split_rate_limits
+)
+
+# supabase 和异步引擎（httpx）在首次使用时才导入，导入本模块时不建立任何网络连接
+if TYPE_CHECKING:
+    from supabase import Client, AsyncClient
 
 # 环境变量配置
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "markdown-files")
 
+# HTTP 连接池配置（所有请求共享同一个连接池）
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", 10))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", 20))
+HTTP_KEEP_ALIVE = os.getenv("HTTP_KEEP_ALIVE", "true").lower() != "false"
+
+# 转换引擎：async（httpx 异步引擎，不阻塞事件循环）或 sync（requests 同步引擎）
+CONVERSION_ENGINE = os.getenv("CONVERSION_ENGINE", "async").lower()
+
+# 执行器配置：阻塞的转换任务在线程池/进程池中运行，不占用事件循环
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", 32))  # 同时进行的转换数上限，超出返回 503
+IO_WORKERS = int(os.getenv("IO_WORKERS", 16))  # 线程池大小（网页获取、媒体下载、上传）
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", 0))  # 进程池大小（同步引擎的解析和渲染），0 表示不启用
+RETRY_AFTER_SECONDS = int(os.getenv("RETRY_AFTER_SECONDS", 5))
+
+# 结果缓存配置：相同 URL 和选项在有效期内直接返回已有结果
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", 86400))  # 秒，0 表示禁用缓存
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 1024))  # 内存缓存条目上限
+
+# 批量转换配置
+BATCH_MAX_URLS = int(os.getenv("BATCH_MAX_URLS", 500))  # 单次批量请求的 URL 上限
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", 8))  # 单次批量请求的并发转换数
+BATCH_PER_HOST_LIMIT = int(os.getenv("BATCH_PER_HOST_LIMIT", 2))  # 单个主机同时进行的转换数
+
+# 异步任务配置
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", 8))  # 同时执行的异步任务数
+JOB_RETENTION = int(os.getenv("JOB_RETENTION", 1000))  # 内存中保留的任务数
+CALLBACK_MAX_RETRIES = int(os.getenv("CALLBACK_MAX_RETRIES", 5))
+CALLBACK_TIMEOUT = int(os.getenv("CALLBACK_TIMEOUT", 10))
+
+# 上传重试：临时故障（超时、5xx、429）按指数退避加抖动重试，总耗时不超过预算
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", 3))
+UPLOAD_RETRY_BUDGET = float(os.getenv("UPLOAD_RETRY_BUDGET", 60))
+upload_retry_policy = RetryPolicy(max_attempts=UPLOAD_MAX_ATTEMPTS, budget=UPLOAD_RETRY_BUDGET)
+
+# HTML 解析器（lxml / html.parser），为空时使用已安装的最快解析器
+HTML_PARSER = os.getenv("HTML_PARSER") or None
+
+# 媒体下载并发配置
+MEDIA_WORKERS = int(os.getenv("MEDIA_WORKERS", 8))
+MEDIA_PER_HOST_LIMIT = int(os.getenv("MEDIA_PER_HOST_LIMIT", 4))  # 单个主机的初始并发数，之后自适应调整
+MEDIA_MAX_PER_HOST = int(os.getenv("MEDIA_MAX_PER_HOST", 16))  # 单个主机自适应并发数的上限
+
+# 永久失败（404、文章已删除等）的 URL 在多少秒内直接返回失败，0 表示不记录
+NEGATIVE_CACHE_TTL = int(os.getenv("NEGATIVE_CACHE_TTL", 600))
+
+# 按主机名后缀限速：在默认规则基础上覆盖，如 "mp.weixin.qq.com=2:5,csdn.net=1"；RATE_LIMIT_ENABLED=false 不限速
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+RATE_LIMITS = (
+    {**DEFAULT_RATE_LIMITS, **parse_rate_limits([os.getenv("RATE_LIMITS", "")])}
+    if RATE_LIMIT_ENABLED else {}
+)
+
 app = FastAPI(
     title="HTML to Markdown API",
     description="将网页 URL 转换为 Markdown 格式并存储到 Supabase",
@@ -39,11 +109,81 @@ app.add_middleware(
 )
 
 
+class ServiceBusyError(Exception):
+    """同时进行的转换数已达上限"""
+
+
+class ConversionExecutor:
+    """
+    转换任务执行器
+
+    I/O 密集的任务（网页获取、媒体下载、上传）放到线程池，CPU 密集的解析和渲染放到进程池
+    （未启用进程池时回退到线程池），并限制同时进行的转换数量。
+    """
+
+    def __init__(self, max_in_flight: int, io_workers: int, cpu_workers: int = 0):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.io_pool = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="html2md-io")
+        self.cpu_pool = None
+        self.cpu_workers = cpu_workers
+        if cpu_workers > 0:
+            # 使用 spawn 避免子进程继承父进程的网络连接
+            self.cpu_pool = ProcessPoolExecutor(
+                max_workers=cpu_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+
+    @contextmanager
+    def slot(self):
+        """占用一个转换名额，已满时抛出 ServiceBusyError"""
+        if self.in_flight >= self.max_in_flight:
+            raise ServiceBusyError(f"同时进行的转换数已达上限 ({self.max_in_flight})")
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+
+    async def run_io(self, func, *args, **kwargs):
+        """在线程池中执行阻塞任务"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_pool, functools.partial(func, *args, **kwargs))
+
+    async def run_cpu(self, func, *args, **kwargs):
+        """在进程池中执行 CPU 密集任务（参数和返回值需可 pickle）"""
+        loop = asyncio.get_running_loop()
+        pool = self.cpu_pool or self.io_pool
+        return await loop.run_in_executor(pool, functools.partial(func, *args, **kwargs))
+
+    def stats(self) -> dict:
+        """执行器状态"""
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "cpu_pool": self.cpu_pool is not None
+        }
+
+    def shutdown(self):
+        """关闭线程池和进程池"""
+        self.io_pool.shutdown(wait=False)
+        if self.cpu_pool:
+            self.cpu_pool.shutdown(wait=False)
+
+
 class ConvertRequest(BaseModel):
     """转换请求"""
     url: HttpUrl
     download_media: bool = True
     callback_url: Optional[str] = None  # 可选的回调 URL（用于异步通知）
+    refresh: bool = False  # 忽略缓存，强制重新转换
+
+
+class BatchConvertRequest(BaseModel):
+    """批量转换请求"""
+    urls: List[HttpUrl] = Field(..., min_length=1, max_length=BATCH_MAX_URLS)
+    download_media: bool = True
+    refresh: bool = False  # 忽略缓存，强制重新转换
 
 
 class ConvertResponse(BaseModel):
@@ -53,39 +193,295 @@ class ConvertResponse(BaseModel):
     data: Optional[dict] = None
 
 
+class ResultCache:
+    """
+    转换结果缓存
+
+    按规范化 URL 和转换选项缓存结果：内存层为带 TTL 的 LRU，
+    内存未命中时查询 conversions 表中有效期内的最近一次转换。
+    """
+
+    def __init__(self, ttl: int, max_size: int):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (过期时间, 结果)
+
+    @staticmethod
+    def make_key(url: str, download_media: bool) -> tuple:
+        """缓存键：规范化 URL + 转换选项"""
+        return canonicalize_url(url), bool(download_media)
+
+    def get(self, key: tuple) -> Optional[dict]:
+        """查询内存缓存，过期条目直接丢弃"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: tuple, result: dict, created_at: Optional[float] = None):
+        """写入内存缓存，超出容量时淘汰最久未使用的条目"""
+        if self.ttl <= 0:
+            return
+        self.entries[key] = ((created_at or time.time()) + self.ttl, result)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    async def lookup(self, key: tuple) -> Optional[dict]:
+        """先查内存，再查 conversions 表（命中后回填内存）"""
+        if self.ttl <= 0:
+            return None
+        result = self.get(key)
+        if result is not None or not storage:
+            return result
+
+        canonical_url, download_media = key
+        since = datetime.utcnow() - timedelta(seconds=self.ttl)
+        row = await conversion_executor.run_io(
+            storage.find_conversion, canonical_url, download_media, since.isoformat()
+        )
+        if not row or not row.get("md_file_url"):
+            return None
+
+        result = {
+            "md_url": row["md_file_url"],
+            "md_filename": row.get("md_filename"),
+            "media_files": row.get("media_count", 0),
+            "unique_id": row.get("unique_id")
+        }
+        created_at = datetime.fromisoformat(row["created_at"].replace("Z", "+00:00"))
+        self.put(key, result, created_at.timestamp())
+        return result
+
+
+class SingleFlight:
+    """合并相同键的并发请求：同一时刻只执行一次，所有等待者共享同一个结果（或异常）"""
+
+    def __init__(self):
+        self.calls: dict = {}  # key -> asyncio.Task
+        self.listeners: dict = {}  # key -> [各等待者的 on_stage]
+        self.stages: dict = {}  # key -> 调用最近报告的阶段
+
+    def pending(self, key) -> bool:
+        """该键是否有正在进行的调用"""
+        return key in self.calls
+
+    async def run(self, key, func, on_stage: Optional[Callable[[str], None]] = None):
+        """
+        执行 func(notify)，若相同键已有调用在进行则等待其结果
+
+        调用在独立的任务中执行，不属于任何一个请求：发起调用的请求被取消（如批量请求的客户端断开）时，
+        转换继续进行，其他等待者照常拿到结果。func 通过 notify(stage) 报告阶段，
+        所有等待者的 on_stage 都会收到；中途加入的等待者先收到当前阶段。
+
+        Returns:
+            (结果, 是否复用了其他请求的调用)
+        """
+        task = self.calls.get(key)
+        coalesced = task is not None
+        if task is None:
+            listeners = self.listeners[key] = []
+
+            def notify(stage):
+                self.stages[key] = stage
+                for listener in list(listeners):
+                    listener(stage)
+
+            task = asyncio.create_task(func(notify))
+            self.calls[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            listeners = self.listeners[key]
+            if on_stage and key in self.stages:
+                on_stage(self.stages[key])
+
+        if on_stage:
+            listeners.append(on_stage)
+        try:
+            # shield：任一调用方被取消时只取消它自己的等待，不影响正在进行的调用
+            return await asyncio.shield(task), coalesced
+        finally:
+            if on_stage in listeners:
+                listeners.remove(on_stage)
+
+    def _finish(self, key, task):
+        if self.calls.get(key) is task:
+            del self.calls[key]
+            self.listeners.pop(key, None)
+            self.stages.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # 标记异常已读取，没有等待者时不输出警告
+
+
+class HostFairQueue:
+    """
+    按主机公平调度的 URL 队列
+
+    各主机的 URL 轮流取出，并限制每个主机同时进行的转换数，
+    避免某个主机的大量 URL 占满所有并发名额。
+    """
+
+    def __init__(self, urls: List[str], per_host_limit: int):
+        self.per_host_limit = per_host_limit
+        self.queues: "OrderedDict[str, deque]" = OrderedDict()  # host -> deque[(序号, url)]
+        for index, url in enumerate(urls):
+            host = urlparse(url).hostname or ""
+            self.queues.setdefault(host, deque()).append((index, url))
+        self.active = defaultdict(int)
+        self.changed = asyncio.Condition()
+
+    async def next(self) -> Optional[tuple]:
+        """取出下一个可执行的 (主机, 序号, url)，队列为空时返回 None"""
+        async with self.changed:
+            while self.queues:
+                for host in self.queues:
+                    if self.active[host] < self.per_host_limit:
+                        index, url = self.queues[host].popleft()
+                        if self.queues[host]:
+                            self.queues.move_to_end(host)  # 轮到下一个主机
+                        else:
+                            del self.queues[host]
+                        self.active[host] += 1
+                        return host, index, url
+                await self.changed.wait()
+            return None
+
+    async def done(self, host: str):
+        """标记该主机的一个转换已完成"""
+        async with self.changed:
+            self.active[host] -= 1
+            self.changed.notify_all()
+
+
+class JobStore:
+    """
+    异步转换任务存储（内存）
+
+    任务状态 status: queued / running / succeeded / failed
+    任务阶段 stage: queued / converting / uploading / saving / done
+    """
+
+    def __init__(self, retention: int):
+        self.retention = retention
+        self.jobs: "OrderedDict[str, dict]" = OrderedDict()
+
+    def create(self, url: str, download_media: bool, callback_url: Optional[str],
+               refresh: bool = False) -> dict:
+        """创建任务（超出保留数量时淘汰最早结束的任务，排队和执行中的任务不淘汰）"""
+        now = datetime.utcnow().isoformat()
+        job = {
+            "job_id": uuid.uuid4().hex,
+            "url": url,
+            "download_media": download_media,
+            "callback_url": callback_url,
+            "refresh": refresh,
+            "status": "queued",
+            "stage": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "result": None,
+            "error": None,
+            "callback": None
+        }
+        self.jobs[job["job_id"]] = job
+        excess = len(self.jobs) - self.retention
+        if excess > 0:
+            finished = [job_id for job_id, item in self.jobs.items()
+                        if item["status"] in ("succeeded", "failed")]
+            for job_id in finished[:excess]:
+                del self.jobs[job_id]
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """获取任务，不存在时返回 None"""
+        return self.jobs.get(job_id)
+
+    def update(self, job_id: str, **fields):
+        """更新任务字段"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+            job["updated_at"] = datetime.utcnow().isoformat()
+
+
+class RetryCounter:
+    """重试回调：统计一次转换中上传的重试次数并记录日志"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, attempt: int, delay: float, error: Exception):
+        with self._lock:
+            self.count += 1
+        print(f"Warning: Upload failed (attempt {attempt}), retrying in {delay:.1f}s: {error}")
+
+
 class SupabaseStorage:
-    """Supabase 存储管理类"""
+    """Supabase 存储管理类（客户端在首次使用时创建）"""
 
     def __init__(self):
         if not SUPABASE_URL or not SUPABASE_KEY:
             raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY environment variables")
 
-        self.client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
         self.bucket = SUPABASE_BUCKET
-        self._ensure_bucket()
+        self._client: Optional["Client"] = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> "Client":
+        """Supabase 客户端（首次访问时创建并确保存储桶存在）"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from supabase import create_client
 
-    def _ensure_bucket(self):
+                    client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                    self._ensure_bucket(client)
+                    self._client = client
+        return self._client
+
+    def _ensure_bucket(self, client: "Client"):
         """确保存储桶存在"""
         try:
             # 尝试获取桶信息
-            self.client.storage.get_bucket(self.bucket)
+            client.storage.get_bucket(self.bucket)
         except Exception:
             # 如果不存在，创建桶（公开访问）
             try:
-                self.client.storage.create_bucket(
+                client.storage.create_bucket(
                     self.bucket,
                     options={"public": True}
                 )
             except Exception as e:
                 print(f"Warning: Could not create bucket: {e}")
 
-    def upload_file(self, local_path: str, remote_path: str) -> str:
+    def _upload(self, remote_path: str, file_data: bytes, content_type: str,
+                on_retry: Optional[Callable] = None):
+        """上传数据，临时故障按 upload_retry_policy 重试
+
+        远程路径每次转换都不同，使用 upsert 使重试是幂等的（上次请求实际已成功时不会报文件已存在）。
+        """
+        bucket = self.client.storage.from_(self.bucket)
+        upload_retry_policy.call(
+            bucket.upload, remote_path, file_data, {"content-type": content_type, "upsert": "true"},
+            on_retry=on_retry
+        )
+
+    def upload_file(self, local_path: str, remote_path: str,
+                    on_retry: Optional[Callable] = None) -> str:
         """
         上传文件到 Supabase Storage
 
         Args:
             local_path: 本地文件路径
             remote_path: 远程文件路径
+            on_retry: 可选的重试回调（RetryCounter）
 
         Returns:
             公开访问 URL
@@ -94,23 +490,21 @@ class SupabaseStorage:
             file_data = f.read()
 
         # 上传文件
-        self.client.storage.from_(self.bucket).upload(
-            remote_path,
-            file_data,
-            file_options={"content-type": "text/markdown; charset=utf-8"}
-        )
+        self._upload(remote_path, file_data, "text/markdown; charset=utf-8", on_retry)
 
         # 获取公开 URL
         public_url = self.client.storage.from_(self.bucket).get_public_url(remote_path)
         return public_url
 
-    def upload_directory(self, local_dir: str, remote_prefix: str) -> dict:
+    def upload_directory(self, local_dir: str, remote_prefix: str,
+                         on_retry: Optional[Callable] = None) -> dict:
         """
         上传整个目录（包括媒体文件）
 
         Args:
             local_dir: 本地目录路径
             remote_prefix: 远程路径前缀
+            on_retry: 可选的重试回调（RetryCounter）
 
         Returns:
             文件映射字典 {本地路径: 公开URL}
@@ -131,11 +525,7 @@ class SupabaseStorage:
                 # 确定 content-type
                 content_type = self._get_content_type(file_path.suffix)
 
-                self.client.storage.from_(self.bucket).upload(
-                    remote_path,
-                    file_data,
-                    file_options={"content-type": content_type}
-                )
+                self._upload(remote_path, file_data, content_type, on_retry)
 
                 public_url = self.client.storage.from_(self.bucket).get_public_url(remote_path)
                 uploaded_files[str(file_path)] = public_url
@@ -164,30 +554,164 @@ class SupabaseStorage:
         except Exception as e:
             print(f"Warning: Could not save metadata: {e}")
 
+    def find_conversion(self, url: str, download_media: bool, since: str) -> Optional[dict]:
+        """查询指定时间之后该 URL 最近一次的转换记录"""
+        try:
+            response = (
+                self.client.table('conversions')
+                .select('md_file_url, md_filename, media_count, unique_id, created_at')
+                .eq('url', url)
+                .eq('download_media', download_media)
+                .gte('created_at', since)
+                .order('created_at', desc=True)
+                .limit(1)
+                .execute()
+            )
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Warning: Could not query conversions: {e}")
+            return None
+
 
-# 初始化存储
+class AsyncSupabaseStorage:
+    """Supabase 异步存储管理类（供异步转换引擎使用）"""
+
+    def __init__(self, client: "AsyncClient"):
+        self.client = client
+        self.bucket = SUPABASE_BUCKET
+
+    @classmethod
+    async def create(cls) -> "AsyncSupabaseStorage":
+        """创建异步存储实例（存储桶由同步的 SupabaseStorage 负责创建）"""
+        if not SUPABASE_URL or not SUPABASE_KEY:
+            raise ValueError("Missing SUPABASE_URL or SUPABASE_KEY environment variables")
+        from supabase import acreate_client
+
+        client = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        return cls(client)
+
+    async def upload_bytes(self, file_data: bytes, remote_path: str, content_type: str,
+                           on_retry: Optional[Callable] = None) -> str:
+        """上传数据并返回公开访问 URL（临时故障按 upload_retry_policy 重试，upsert 使重试幂等）"""
+        bucket = self.client.storage.from_(self.bucket)
+        await upload_retry_policy.acall(
+            bucket.upload, remote_path, file_data, {"content-type": content_type, "upsert": "true"},
+            on_retry=on_retry
+        )
+        return await bucket.get_public_url(remote_path)
+
+    async def upload_file(self, local_path: str, remote_path: str,
+                          on_retry: Optional[Callable] = None) -> str:
+        """上传 Markdown 文件到 Supabase Storage，返回公开访问 URL"""
+        file_data = Path(local_path).read_bytes()
+        return await self.upload_bytes(file_data, remote_path, "text/markdown; charset=utf-8", on_retry)
+
+    async def upload_directory(self, local_dir: str, remote_prefix: str,
+                               on_retry: Optional[Callable] = None) -> dict:
+        """并发上传整个目录（包括媒体文件），返回 {本地路径: 公开URL}"""
+        local_dir_path = Path(local_dir)
+        files = [p for p in local_dir_path.rglob("*") if p.is_file()]
+
+        async def upload(file_path: Path):
+            rel_path = file_path.relative_to(local_dir_path.parent)
+            content_type = self._get_content_type(file_path.suffix)
+            public_url = await self.upload_bytes(
+                file_path.read_bytes(), f"{remote_prefix}/{rel_path}", content_type, on_retry
+            )
+            return str(file_path), public_url
+
+        return dict(await asyncio.gather(*(upload(p) for p in files)))
+
+    _get_content_type = SupabaseStorage._get_content_type
+
+    async def save_metadata(self, metadata: dict):
+        """保存转换元数据到数据库"""
+        try:
+            await self.client.table('conversions').insert(metadata).execute()
+        except Exception as e:
+            print(f"Warning: Could not save metadata: {e}")
+
+
+# 初始化存储（只检查配置，客户端在首次上传或查询时创建）
 try:
     storage = SupabaseStorage()
 except Exception as e:
     print(f"Warning: Supabase not configured: {e}")
     storage = None
 
+# 共享连接池：同一主机（如 mmbiz.qpic.cn）的连接在请求之间复用
+http_session = create_session(
+    pool_connections=HTTP_POOL_CONNECTIONS,
+    pool_maxsize=HTTP_POOL_MAXSIZE
+)
+
+conversion_executor = ConversionExecutor(
+    max_in_flight=MAX_IN_FLIGHT,
+    io_workers=IO_WORKERS,
+    cpu_workers=CPU_WORKERS
+)
+
+result_cache = ResultCache(ttl=RESULT_CACHE_TTL, max_size=RESULT_CACHE_SIZE)
+single_flight = SingleFlight()
+jobs = JobStore(retention=JOB_RETENTION)
+job_slots = asyncio.Semaphore(JOB_CONCURRENCY)
+
+# 异步引擎的共享连接池和存储客户端（在首次使用时创建，需在事件循环内）
+async_http_client = None
+async_storage: Optional[AsyncSupabaseStorage] = None
+
+
+def generate_unique_id(url: str) -> str:
+    """生成唯一的文件夹名称"""
+    url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return f"{timestamp}_{url_hash}"
+
+
+def build_metadata(url: str, md_public_url: str, download_media: bool, media_count: int,
+                   md_filename: str, unique_id: str) -> dict:
+    """构建转换元数据（写入 conversions 表，url 为规范化 URL，供结果缓存查询）"""
+    return {
+        "id": str(uuid.uuid4()),
+        "url": canonicalize_url(url),
+        "md_file_url": md_public_url,
+        "md_filename": md_filename,
+        "unique_id": unique_id,
+        "download_media": download_media,
+        "created_at": datetime.utcnow().isoformat(),
+        "media_count": media_count
+    }
+
 
-def process_conversion(url: str, download_media: bool) -> dict:
+def converter_options(download_media: bool) -> dict:
+    """转换器配置（可 pickle，供进程池使用）"""
+    return {
+        "download_media": download_media,
+        "keep_alive": HTTP_KEEP_ALIVE,
+        "media_workers": MEDIA_WORKERS,
+        "per_host_limit": MEDIA_PER_HOST_LIMIT,
+        "max_per_host": MEDIA_MAX_PER_HOST,
+        "negative_ttl": NEGATIVE_CACHE_TTL,
+        "parser_backend": HTML_PARSER,
+        "rate_limits": RATE_LIMITS
+    }
+
+
+def process_conversion(url: str, download_media: bool,
+                       on_stage: Optional[Callable[[str], None]] = None) -> dict:
     """
     处理转换逻辑
 
     Args:
         url: 要转换的 URL
         download_media: 是否下载媒体资源
+        on_stage: 可选的阶段回调（converting / uploading / saving）
 
     Returns:
         转换结果字典
     """
-    # 生成唯一的文件夹名称
-    url_hash = hashlib.md5(url.encode()).hexdigest()[:8]
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    unique_id = f"{timestamp}_{url_hash}"
+    if on_stage:
+        on_stage("converting")
 
     # 创建临时目录
     with tempfile.TemporaryDirectory() as temp_dir:
@@ -195,53 +719,320 @@ def process_conversion(url: str, download_media: bool) -> dict:
         os.makedirs(output_dir, exist_ok=True)
 
         # 执行转换
-        converter = HTML2Markdown(download_media=download_media)
+        converter = HTML2Markdown(session=http_session, **converter_options(download_media))
         md_file_path = converter.convert(
             url=url,
             output_path=None,
             output_dir=output_dir
         )
 
-        # 提取文件名（不含路径）
-        md_filename = os.path.basename(md_file_path)
-        base_name = os.path.splitext(md_filename)[0]
+        return upload_conversion(url, download_media, output_dir, md_file_path, on_stage,
+                                 converter.retries)
+
+
+def upload_conversion(url: str, download_media: bool, output_dir: str, md_file_path: str,
+                      on_stage: Optional[Callable[[str], None]] = None,
+                      retries: Optional[int] = None) -> dict:
+    """
+    上传转换结果到 Supabase 并保存元数据
+
+    Args:
+        url: 原始 URL
+        download_media: 是否下载了媒体资源
+        output_dir: 转换输出目录
+        md_file_path: Markdown 文件路径
+        on_stage: 可选的阶段回调
+        retries: 转换（网页获取和媒体下载）中的重试次数；在进程池中转换时无法取得，为None
+
+    Returns:
+        转换结果字典（retries 为转换和上传的重试次数之和，转换的重试次数未知时省略）
+    """
+    retry_counter = RetryCounter()
+    unique_id = generate_unique_id(url)
+
+    # 提取文件名（不含路径）
+    md_filename = os.path.basename(md_file_path)
+    base_name = os.path.splitext(md_filename)[0]
+
+    # 上传到 Supabase
+    if not storage:
+        raise Exception("Supabase storage not configured")
+
+    if on_stage:
+        on_stage("uploading")
+
+    # 上传 Markdown 文件
+    md_remote_path = f"{unique_id}/{md_filename}"
+    md_public_url = storage.upload_file(md_file_path, md_remote_path, retry_counter)
+
+    # 上传媒体文件（如果有）
+    media_files = {}
+    media_dir = os.path.join(output_dir, f"{base_name}_files")
+    if download_media and os.path.exists(media_dir):
+        media_files = storage.upload_directory(output_dir, unique_id, retry_counter)
+
+    # 保存元数据
+    if on_stage:
+        on_stage("saving")
+    storage.save_metadata(build_metadata(
+        url, md_public_url, download_media, len(media_files), md_filename, unique_id
+    ))
+
+    result = {
+        "md_url": md_public_url,
+        "md_filename": md_filename,
+        "media_files": len(media_files),
+        "unique_id": unique_id
+    }
+    if retries is not None:
+        result["retries"] = retries + retry_counter.count
+    return result
+
+
+async def process_conversion_offloaded(url: str, download_media: bool,
+                                      on_stage: Optional[Callable[[str], None]] = None) -> dict:
+    """同步引擎：转换在进程池中执行，上传在线程池中执行"""
+    if on_stage:
+        on_stage("converting")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir, exist_ok=True)
 
-        # 上传到 Supabase
+        # 限速按进程计数：各子进程平分限额，合计不超过配置的速率
+        options = converter_options(download_media)
+        options["rate_limits"] = split_rate_limits(options["rate_limits"], conversion_executor.cpu_workers)
+        md_file_path = await conversion_executor.run_cpu(
+            convert_url_to_dir, url, None, output_dir, **options
+        )
+        return await conversion_executor.run_io(
+            upload_conversion, url, download_media, output_dir, md_file_path, on_stage
+        )
+
+
+async def get_async_storage() -> AsyncSupabaseStorage:
+    """获取共享的异步存储客户端"""
+    global async_storage
+    if async_storage is None:
         if not storage:
             raise Exception("Supabase storage not configured")
+        # 存储桶由同步客户端负责创建（首次访问 client 时在线程池中完成）
+        await conversion_executor.run_io(getattr, storage, "client")
+        async_storage = await AsyncSupabaseStorage.create()
+    return async_storage
+
 
-        # 远程路径前缀
-        remote_prefix = f"{unique_id}/{base_name}"
+def get_async_http_client():
+    """获取共享的异步 HTTP 连接池"""
+    global async_http_client
+    if async_http_client is None:
+        from html2md_async import create_async_client
 
-        # 上传 Markdown 文件
-        md_remote_path = f"{unique_id}/{md_filename}"
-        md_public_url = storage.upload_file(md_file_path, md_remote_path)
+        async_http_client = create_async_client(max_keepalive_connections=HTTP_POOL_MAXSIZE)
+    return async_http_client
+
+
+async def process_conversion_async(url: str, download_media: bool,
+                                   on_stage: Optional[Callable[[str], None]] = None) -> dict:
+    """
+    处理转换逻辑（异步引擎，网页获取、媒体下载和上传都不阻塞事件循环）
+
+    Args:
+        url: 要转换的 URL
+        download_media: 是否下载媒体资源
+        on_stage: 可选的阶段回调（converting / uploading / saving）
+
+    Returns:
+        转换结果字典
+    """
+    unique_id = generate_unique_id(url)
+    remote_storage = await get_async_storage()
+    if on_stage:
+        on_stage("converting")
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        output_dir = os.path.join(temp_dir, "output")
+        os.makedirs(output_dir, exist_ok=True)
+
+        from html2md_async import AsyncHTML2Markdown
+
+        converter = AsyncHTML2Markdown(
+            client=get_async_http_client(),
+            executor=conversion_executor.io_pool,
+            **converter_options(download_media)
+        )
+        md_file_path = await converter.convert(url=url, output_path=None, output_dir=output_dir)
+
+        md_filename = os.path.basename(md_file_path)
+        base_name = os.path.splitext(md_filename)[0]
+
+        if on_stage:
+            on_stage("uploading")
+        retry_counter = RetryCounter()
+        md_public_url = await remote_storage.upload_file(
+            md_file_path, f"{unique_id}/{md_filename}", retry_counter
+        )
 
-        # 上传媒体文件（如果有）
         media_files = {}
         media_dir = os.path.join(output_dir, f"{base_name}_files")
         if download_media and os.path.exists(media_dir):
-            media_files = storage.upload_directory(output_dir, unique_id)
+            media_files = await remote_storage.upload_directory(output_dir, unique_id, retry_counter)
 
-        # 保存元数据
-        metadata = {
-            "id": str(uuid.uuid4()),
-            "url": url,
-            "md_file_url": md_public_url,
-            "download_media": download_media,
-            "created_at": datetime.utcnow().isoformat(),
-            "media_count": len(media_files)
-        }
-        storage.save_metadata(metadata)
+        if on_stage:
+            on_stage("saving")
+        await remote_storage.save_metadata(
+            build_metadata(url, md_public_url, download_media, len(media_files),
+                           md_filename, unique_id)
+        )
 
         return {
             "md_url": md_public_url,
             "md_filename": md_filename,
             "media_files": len(media_files),
-            "unique_id": unique_id
+            "unique_id": unique_id,
+            "retries": converter.retries + retry_counter.count
         }
 
 
+async def run_conversion(url: str, download_media: bool,
+                         on_stage: Optional[Callable[[str], None]] = None,
+                         refresh: bool = False) -> dict:
+    """
+    转换 URL：优先返回缓存结果；相同 URL 正在转换时等待其结果；
+    否则按 CONVERSION_ENGINE 配置选择转换引擎，阻塞任务不在事件循环中执行
+
+    Args:
+        url: 要转换的 URL
+        download_media: 是否下载媒体资源
+        on_stage: 可选的阶段回调
+        refresh: 忽略缓存，强制重新转换
+
+    Raises:
+        ServiceBusyError: 同时进行的转换数已达上限
+    """
+    cache_key = ResultCache.make_key(url, download_media)
+    if not refresh:
+        cached = await result_cache.lookup(cache_key)
+        if cached is not None:
+            return {**cached, "cached": True, "coalesced": False}
+
+    async def convert(notify):
+        with conversion_executor.slot():
+            if CONVERSION_ENGINE == "async":
+                result = await process_conversion_async(url, download_media, notify)
+            elif conversion_executor.cpu_pool:
+                result = await process_conversion_offloaded(url, download_media, notify)
+            else:
+                result = await conversion_executor.run_io(
+                    process_conversion, url, download_media, notify
+                )
+        result_cache.put(cache_key, result)
+        return result
+
+    # 相同 URL 和选项的并发请求合并到同一次转换，各请求都会收到转换的阶段
+    result, coalesced = await single_flight.run(cache_key, convert, on_stage)
+    return {**result, "cached": False, "coalesced": coalesced}
+
+
+def service_busy(e: ServiceBusyError) -> HTTPException:
+    """转换名额已满时返回 503，并提示客户端稍后重试"""
+    return HTTPException(
+        status_code=503,
+        detail=f"服务繁忙: {e}",
+        headers={"Retry-After": str(RETRY_AFTER_SECONDS)}
+    )
+
+
+def job_payload(job: dict) -> dict:
+    """任务的公开信息（GET /api/jobs/{id} 和回调共用）"""
+    return {
+        "job_id": job["job_id"],
+        "url": job["url"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "result": job["result"],
+        "error": job["error"],
+        "callback": job["callback"]
+    }
+
+
+async def deliver_callback(callback_url: str, payload: dict, job_id: Optional[str] = None) -> bool:
+    """
+    将转换结果 POST 到 callback_url，失败时按指数退避重试
+
+    Args:
+        callback_url: 回调地址
+        payload: 回调内容
+        job_id: 关联的任务ID（用于记录回调状态）
+
+    Returns:
+        是否投递成功
+    """
+    client = get_async_http_client()
+    for attempt in range(1, CALLBACK_MAX_RETRIES + 1):
+        try:
+            response = await client.post(callback_url, json=payload, timeout=CALLBACK_TIMEOUT)
+            response.raise_for_status()
+            if job_id:
+                jobs.update(job_id, callback={"delivered": True, "attempts": attempt, "error": None})
+            return True
+        except Exception as e:
+            print(f"Warning: Callback failed ({attempt}/{CALLBACK_MAX_RETRIES}) {callback_url}: {e}")
+            if job_id:
+                jobs.update(job_id, callback={"delivered": False, "attempts": attempt, "error": str(e)})
+            if attempt < CALLBACK_MAX_RETRIES:
+                await asyncio.sleep(2 ** (attempt - 1))
+    return False
+
+
+async def run_conversion_when_ready(url: str, download_media: bool,
+                                    on_stage: Optional[Callable[[str], None]] = None,
+                                    refresh: bool = False) -> dict:
+    """转换 URL，转换名额已满时排队等待（用于异步任务和批量转换）"""
+    while True:
+        try:
+            return await run_conversion(url, download_media, on_stage=on_stage, refresh=refresh)
+        except ServiceBusyError:
+            if on_stage:
+                on_stage("queued")
+            await asyncio.sleep(RETRY_AFTER_SECONDS)
+
+
+async def run_job(job_id: str):
+    """执行异步任务，完成后投递回调"""
+    job = jobs.get(job_id)
+    if job is None:
+        return
+
+    async with job_slots:
+        jobs.update(job_id, status="running")
+        try:
+            result = await run_conversion_when_ready(
+                job["url"], job["download_media"],
+                on_stage=lambda stage: jobs.update(job_id, stage=stage),
+                refresh=job["refresh"]
+            )
+            outcome = {"status": "succeeded", "result": result}
+        except Exception as e:
+            outcome = {"status": "failed", "error": f"转换失败: {str(e)}"}
+        outcome.update(stage="done", updated_at=datetime.utcnow().isoformat())
+        jobs.update(job_id, **outcome)
+
+    if job["callback_url"]:
+        # 回调内容按本次执行的结果生成，不依赖任务是否仍在 JobStore 中
+        await deliver_callback(job["callback_url"], job_payload({**job, **outcome}), job_id)
+
+
+@app.on_event("shutdown")
+async def close_async_clients():
+    """关闭共享的异步 HTTP 连接池和执行器"""
+    if async_http_client is not None:
+        await async_http_client.aclose()
+    conversion_executor.shutdown()
+
+
 @app.get("/")
 async def root():
     """API 根路径"""
@@ -251,6 +1042,8 @@ async def root():
         "docs": "/docs",
         "endpoints": {
             "convert": "/api/convert",
+            "batch": "/api/convert/batch",
+            "jobs": "/api/jobs",
             "health": "/health"
         }
     }
@@ -269,6 +1062,11 @@ async def health_check():
         "status": "healthy",
         "supabase": supabase_status,
         "timestamp": datetime.utcnow().isoformat(),
+        "executor": conversion_executor.stats(),
+        "result_cache": {"entries": len(result_cache.entries), "ttl": result_cache.ttl},
+        "in_flight_urls": len(single_flight.calls),
+        # 各主机当前的熔断状态、自适应并发数、平均延迟和限流次数（进程池中的转换各自统计，不在此列）
+        "hosts": get_host_concurrency(MEDIA_PER_HOST_LIMIT, MEDIA_MAX_PER_HOST).limits(),
         "dependencies": {
             "requests": requests.__version__,
             "urllib3": urllib3.__version__
@@ -284,10 +1082,19 @@ async def convert_url(request: ConvertRequest, background_tasks: BackgroundTasks
     - **url**: 要转换的网页 URL
     - **download_media**: 是否下载媒体资源（默认 True）
     - **callback_url**: 可选的回调 URL（异步通知结果）
+    - **refresh**: 忽略缓存，强制重新转换
     """
     try:
         # 同步处理（小任务）
-        result = process_conversion(str(request.url), request.download_media)
+        result = await run_conversion(str(request.url), request.download_media,
+                                      refresh=request.refresh)
+
+        if request.callback_url:
+            background_tasks.add_task(deliver_callback, request.callback_url, {
+                "url": str(request.url),
+                "status": "succeeded",
+                "result": result
+            })
 
         return ConvertResponse(
             success=True,
@@ -295,6 +1102,8 @@ async def convert_url(request: ConvertRequest, background_tasks: BackgroundTasks
             data=result
         )
 
+    except ServiceBusyError as e:
+        raise service_busy(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -303,16 +1112,17 @@ async def convert_url(request: ConvertRequest, background_tasks: BackgroundTasks
 
 
 @app.get("/api/convert")
-async def convert_url_get(url: str, download_media: bool = True):
+async def convert_url_get(url: str, download_media: bool = True, refresh: bool = False):
     """
     GET 方式转换 URL（方便测试和简单调用）
 
     参数:
     - url: 要转换的网页 URL
     - download_media: 是否下载媒体资源
+    - refresh: 忽略缓存，强制重新转换
     """
     try:
-        result = process_conversion(url, download_media)
+        result = await run_conversion(url, download_media, refresh=refresh)
 
         return ConvertResponse(
             success=True,
@@ -320,6 +1130,8 @@ async def convert_url_get(url: str, download_media: bool = True):
             data=result
         )
 
+    except ServiceBusyError as e:
+        raise service_busy(e)
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -327,6 +1139,97 @@ async def convert_url_get(url: str, download_media: bool = True):
         )
 
 
+async def stream_batch(urls: List[str], download_media: bool, refresh: bool):
+    """并发转换多个 URL，每完成一个就输出一行 NDJSON"""
+    queue = HostFairQueue(urls, BATCH_PER_HOST_LIMIT)
+    lines: asyncio.Queue = asyncio.Queue()
+
+    async def worker():
+        while True:
+            item = await queue.next()
+            if item is None:
+                return
+            host, index, url = item
+            started = time.monotonic()
+            line = {"index": index, "url": url, "success": True, "data": None, "error": None}
+            try:
+                line["data"] = await run_conversion_when_ready(url, download_media, refresh=refresh)
+            except Exception as e:
+                line["success"] = False
+                line["error"] = f"转换失败: {str(e)}"
+            finally:
+                await queue.done(host)
+            line["elapsed"] = round(time.monotonic() - started, 3)
+            await lines.put(line)
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(BATCH_CONCURRENCY, len(urls)))]
+    try:
+        for _ in range(len(urls)):
+            line = await lines.get()
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+    finally:
+        # 客户端断开时取消尚未完成的转换
+        for task in workers:
+            task.cancel()
+
+
+@app.post("/api/convert/batch")
+async def convert_batch(request: BatchConvertRequest):
+    """
+    批量转换多个 URL，以 NDJSON 流式返回结果（每完成一个 URL 输出一行，顺序为完成顺序）
+
+    - **urls**: 要转换的网页 URL 列表
+    - **download_media**: 是否下载媒体资源（默认 True）
+    - **refresh**: 忽略缓存，强制重新转换
+
+    每行格式: {"index", "url", "success", "data", "error", "elapsed"}
+    """
+    urls = [str(url) for url in request.urls]
+    return StreamingResponse(
+        stream_batch(urls, request.download_media, request.refresh),
+        media_type="application/x-ndjson"
+    )
+
+
+@app.post("/api/jobs", response_model=ConvertResponse, status_code=202)
+async def create_job(request: ConvertRequest, background_tasks: BackgroundTasks):
+    """
+    提交异步转换任务，立即返回任务ID
+
+    - **url**: 要转换的网页 URL
+    - **download_media**: 是否下载媒体资源（默认 True）
+    - **callback_url**: 可选的回调 URL，任务完成或失败后 POST 任务结果
+    - **refresh**: 忽略缓存，强制重新转换
+    """
+    job = jobs.create(str(request.url), request.download_media, request.callback_url,
+                      request.refresh)
+    background_tasks.add_task(run_job, job["job_id"])
+
+    return ConvertResponse(
+        success=True,
+        message="任务已提交",
+        data={
+            "job_id": job["job_id"],
+            "status": job["status"],
+            "status_url": f"/api/jobs/{job['job_id']}"
+        }
+    )
+
+
+@app.get("/api/jobs/{job_id}", response_model=ConvertResponse)
+async def get_job(job_id: str):
+    """查询异步任务的状态、阶段和结果"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+
+    return ConvertResponse(
+        success=job["status"] != "failed",
+        message=job["status"],
+        data=job_payload(job)
+    )
+
+
 # 用于 Cloudflare Workers 的入口
 # 如果使用 Cloudflare Workers Python，需要特殊处理
 if __name__ == "__main__":
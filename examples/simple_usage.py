@@ -67,7 +67,7 @@ def example_3_batch_convert():
     print("示例 3: 批量转换多个 URL")
     print("="*60)
 
-    api_url = "http://localhost:8000/api/convert"
+    api_url = "http://localhost:8000/api/convert/batch"
 
     urls = [
         "https://mp.weixin.qq.com/s/xxxxx1",
@@ -75,47 +75,45 @@ def example_3_batch_convert():
         "https://zhuanlan.zhihu.com/p/xxxxx",
     ]
 
+    # 一次请求提交所有 URL，服务端并发转换，每完成一个返回一行 NDJSON
     results = []
-    for i, url in enumerate(urls, 1):
-        print(f"\n[{i}/{len(urls)}] 处理: {url}")
-
-        try:
-            response = requests.post(
-                api_url,
-                json={"url": url, "download_media": True},
-                timeout=300
-            )
-
-            result = response.json()
-            if result['success']:
-                print(f"  ✓ 成功: {result['data']['md_url']}")
-                results.append({
-                    'url': url,
-                    'success': True,
-                    'md_url': result['data']['md_url']
-                })
-            else:
-                print(f"  ✗ 失败: {result['message']}")
-                results.append({
-                    'url': url,
-                    'success': False,
-                    'error': result['message']
-                })
-
-        except Exception as e:
-            print(f"  ✗ 异常: {e}")
-            results.append({
-                'url': url,
-                'success': False,
-                'error': str(e)
-            })
+    try:
+        with requests.post(
+            api_url,
+            json={"urls": urls, "download_media": True},
+            stream=True,
+            timeout=300
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                item = json.loads(line)
+                done = len(results) + 1
+                if item['success']:
+                    print(f"[{done}/{len(urls)}] ✓ {item['url']} -> {item['data']['md_url']} ({item['elapsed']}s)")
+                    results.append({
+                        'url': item['url'],
+                        'success': True,
+                        'md_url': item['data']['md_url']
+                    })
+                else:
+                    print(f"[{done}/{len(urls)}] ✗ {item['url']}: {item['error']}")
+                    results.append({
+                        'url': item['url'],
+                        'success': False,
+                        'error': item['error']
+                    })
+
+    except Exception as e:
+        print(f"  ✗ 异常: {e}")
 
     # 输出总结
     print("\n" + "="*60)
     print("批量转换总结")
     print("="*60)
     success_count = sum(1 for r in results if r['success'])
-    print(f"成功: {success_count}/{len(results)}")
+    print(f"成功: {success_count}/{len(urls)}")
 
     return results
 
@@ -74,30 +74,65 @@ class FeishuWebhookIntegration:
         if result.get('code') != 0:
             raise Exception(f"更新记录失败: {result.get('msg')}")
 
-    def convert_url(self, url: str, download_media: bool = True) -> dict:
+    def convert_url(self, url: str, download_media: bool = True, use_jobs: bool = False,
+                    poll_interval: float = 3, max_wait: float = 600) -> dict:
         """
         调用 API 转换 URL
 
+        默认调用同步接口 /api/convert。任务只保存在处理它的 API 进程的内存中，
+        多进程部署（uvicorn --workers N）时轮询可能落到其他进程，只有单进程部署才适合 use_jobs。
+
         Args:
             url: 要转换的 URL
             download_media: 是否下载媒体资源
+            use_jobs: 提交异步任务后轮询任务状态，避免长时间占用一个 HTTP 连接
+            poll_interval: 轮询间隔（秒）
+            max_wait: 最长等待时间（秒）
 
         Returns:
-            API 响应结果
+            API 响应结果（与 /api/convert 格式一致）
         """
-        api_url = f"{self.api_base_url}/api/convert"
+        if not use_jobs:
+            response = requests.post(
+                f"{self.api_base_url}/api/convert",
+                json={
+                    "url": url,
+                    "download_media": download_media
+                },
+                timeout=max_wait
+            )
+            response.raise_for_status()
+            return response.json()
 
         response = requests.post(
-            api_url,
+            f"{self.api_base_url}/api/jobs",
             json={
                 "url": url,
                 "download_media": download_media
             },
-            timeout=300  # 5分钟超时
+            timeout=30
         )
-
         response.raise_for_status()
-        return response.json()
+        status_url = f"{self.api_base_url}{response.json()['data']['status_url']}"
+
+        deadline = time.time() + max_wait
+        while time.time() < deadline:
+            time.sleep(poll_interval)
+            response = requests.get(status_url, timeout=30)
+            if response.status_code == 404:
+                # 请求可能落到了没有该任务的其他进程，继续轮询直到超时
+                continue
+            response.raise_for_status()
+            job = response.json()['data']
+
+            if job['status'] == 'succeeded':
+                return {"success": True, "message": "转换成功", "data": job['result']}
+            if job['status'] == 'failed':
+                return {"success": False, "message": job['error'], "data": None}
+
+        if response.status_code == 404:
+            raise TimeoutError(f"任务不存在或已过期（{max_wait} 秒内未查询到）")
+        raise TimeoutError(f"转换超时（超过 {max_wait} 秒）")
 
     def handle_new_record(self, record_id: str, url: str):
         """
@@ -4,16 +4,196 @@ HTML转Markdown统一工具
 支持微信公众号、知乎、掘金、CSDN等多个平台
 """
 
+# requests、bs4、html2text 等较重的依赖在首次使用时才导入，
+# 让 --help / --version 和只用到平台识别等轻量功能的调用快速启动
 import re
 import sys
-import argparse
-import requests
-from bs4 import BeautifulSoup
-import html2text
+import time
+import importlib
+import threading
+import contextvars
+from contextlib import contextmanager
 from pathlib import Path
 from urllib.parse import urlparse
 import os
 
+# canonicalize_url 定义在 html2md_net，这里导入以保持 html2md.canonicalize_url 可用
+from html2md_net import DEFAULT_MAX_PER_HOST, DEFAULT_NEGATIVE_TTL, canonicalize_url  # noqa: F401
+
+__version__ = '2.0.0'
+
+
+# 连接池默认配置：pool_connections 为缓存的主机连接池数量，pool_maxsize 为每个主机的最大连接数
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+
+# BeautifulSoup 解析器后端，按速度从快到慢排列
+PARSER_BACKENDS = ('lxml', 'html.parser')
+
+
+def detect_parser_backend():
+    """返回已安装的最快解析器（lxml 优先，html.parser 兜底）"""
+    try:
+        import lxml  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+
+# 媒体下载并发配置：总工作线程数和单个主机的初始并发数（自适应调整的上限见 html2md_net）
+DEFAULT_MEDIA_WORKERS = 8
+DEFAULT_PER_HOST_LIMIT = 4
+
+
+def create_session(pool_connections=DEFAULT_POOL_CONNECTIONS, pool_maxsize=DEFAULT_POOL_MAXSIZE,
+                   max_retries=0):
+    """创建带按主机连接池的Session（可在多个HTML2Markdown实例间共享）
+
+    重试由 HTML2Markdown 的重试策略（html2md_net.RetryPolicy）统一处理，连接池本身默认不重试，
+    避免两层重试叠加。
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        max_retries=max_retries
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_shared_session = None
+
+
+def get_shared_session():
+    """获取进程内共享的Session（首次调用时创建）"""
+    global _shared_session
+    if _shared_session is None:
+        _shared_session = create_session()
+    return _shared_session
+
+
+@contextmanager
+def replace_file(path):
+    """写入同目录的临时文件，完成后替换 path；失败时删除临时文件，path 保持不变
+
+    不直接打开 path 改写：媒体文件可能是媒体库对象的硬链接，原地改写会改掉所有文章共用的那份数据。
+    """
+    temp_path = f"{path}.part-{os.getpid()}-{threading.get_ident()}"
+    try:
+        with open(temp_path, 'wb') as f:
+            yield f
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+class ConversionError(Exception):
+    """转换失败（网页获取失败、未找到正文、保存失败等）"""
+
+
+class ContentUnavailableError(ConversionError):
+    """文章已被删除或无法查看（永久失败，短期内不再重试）"""
+
+    permanent = True
+
+
+class PlatformRegistry:
+    """平台注册表：主机名后缀 → 平台 → 解析器
+
+    主机名按标签倒序存入后缀字典树（mp.weixin.qq.com → com/qq/weixin/mp），
+    检测时取最长匹配的后缀，耗时只与主机名长度有关，不随平台数量增长。
+    解析器可以是类，也可以是 'module:Class' 字符串（首次使用时才导入）。
+    第三方解析器通过 entry point（组名 html2md.parsers）注册，指向一个接收注册表的函数：
+
+        def register(registry):
+            registry.register('example', ['example.com'], 'example_parser:ExampleParser', '示例网站')
+    """
+
+    ENTRY_POINT_GROUP = 'html2md.parsers'
+    DEFAULT_PLATFORM = 'generic'
+
+    def __init__(self):
+        self._trie = {}
+        self._platforms = {}
+        self._plugins_loaded = False
+        self._lock = threading.Lock()
+
+    def register(self, platform, hosts, parser=None, name=None):
+        """注册平台
+
+        Args:
+            platform: 平台ID
+            hosts: 主机名后缀列表（匹配该主机及其所有子域名）
+            parser: 解析器类或 'module:Class' 字符串，为None时使用通用解析器
+            name: 平台显示名称
+        """
+        self._platforms[platform] = {'name': name or platform, 'parser': parser}
+        for host in hosts:
+            node = self._trie
+            for label in reversed(host.lower().strip('.').split('.')):
+                node = node.setdefault(label, {})
+            node[None] = platform  # None 键标记此处为一个已注册后缀的终点
+
+    def load_plugins(self):
+        """加载通过 entry point 注册的第三方解析器（只加载一次）"""
+        if self._plugins_loaded:
+            return
+        with self._lock:
+            if self._plugins_loaded:
+                return
+            from importlib.metadata import entry_points
+            for entry_point in entry_points(group=self.ENTRY_POINT_GROUP):
+                try:
+                    entry_point.load()(self)
+                except Exception as e:
+                    print(f"警告: 加载解析器插件失败 {entry_point.name} - {e}")
+            self._plugins_loaded = True
+
+    def detect(self, url):
+        """按主机名最长后缀匹配平台，未匹配时返回通用平台"""
+        self.load_plugins()
+        platform = self.DEFAULT_PLATFORM
+        host = urlparse(url.strip()).hostname
+        if not host:
+            return platform
+
+        node = self._trie
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            platform = node.get(None, platform)
+        return platform
+
+    def get_name(self, platform):
+        """获取平台显示名称"""
+        entry = self._platforms.get(platform)
+        return entry['name'] if entry else '未知平台'
+
+    def get_parser_class(self, platform):
+        """获取平台的解析器类（按需导入），未注册解析器时返回通用解析器"""
+        entry = self._platforms.get(platform)
+        if entry is None or entry['parser'] is None:
+            entry = self._platforms[self.DEFAULT_PLATFORM]
+        parser = entry['parser']
+        if isinstance(parser, str):
+            module_name, _, class_name = parser.partition(':')
+            parser = entry['parser'] = getattr(importlib.import_module(module_name), class_name)
+        return parser
+
+
+# 全局平台注册表（内置平台在解析器定义之后注册）
+platform_registry = PlatformRegistry()
+
 
 class PlatformDetector:
     """平台检测器"""
@@ -21,75 +201,160 @@ class PlatformDetector:
     @staticmethod
     def detect(url):
         """检测URL所属平台"""
-        if 'mp.weixin.qq.com' in url:
-            return 'wechat'
-        elif 'zhihu.com' in url:
-            return 'zhihu'
-        elif 'xiaohongshu.com' in url or 'xhslink.com' in url:
-            return 'xiaohongshu'
-        elif 'juejin.cn' in url:
-            return 'juejin'
-        elif 'csdn.net' in url:
-            return 'csdn'
-        else:
-            return 'generic'
+        return platform_registry.detect(url)
 
     @staticmethod
     def get_platform_name(platform):
         """获取平台中文名称"""
-        names = {
-            'wechat': '微信公众号',
-            'zhihu': '知乎',
-            'xiaohongshu': '小红书',
-            'juejin': '掘金',
-            'csdn': 'CSDN',
-            'generic': '通用网页'
-        }
-        return names.get(platform, '未知平台')
+        return platform_registry.get_name(platform)
+
+
+class ContentWalker:
+    """正文子树的单次遍历
+
+    各处理阶段按标签名注册访问器，遍历时按注册顺序分发，取代每个阶段各自的 find_all 扫描。
+    """
+
+    def __init__(self):
+        self.visitors = {}
+
+    def register(self, names, visitor):
+        """为指定标签注册访问器；访问器返回True表示节点已被移除，不再遍历其子节点"""
+        for name in names:
+            self.visitors.setdefault(name, []).append(visitor)
+
+    def walk(self, root):
+        """按文档顺序遍历root的所有后代标签（不含root本身）"""
+        from bs4 import Tag
+        stack = [child for child in reversed(root.contents) if isinstance(child, Tag)]
+        while stack:
+            node = stack.pop()
+            removed = False
+            for visitor in self.visitors.get(node.name, ()):
+                if visitor(node):
+                    removed = True
+                    break
+            if not removed:
+                stack.extend(child for child in reversed(node.contents) if isinstance(child, Tag))
+
+
+def remove_tag(tag):
+    """访问器：从文档中移除标签"""
+    tag.decompose()
+    return True
+
+
+def normalize_media_src(tag):
+    """访问器：把懒加载属性（data-src / data-original）补到src，供渲染Markdown使用"""
+    if tag.get('src'):
+        return
+    if tag.get('data-src'):
+        tag['src'] = tag['data-src']
+    elif tag.name == 'img' and tag.get('data-original'):
+        tag['src'] = tag['data-original']
 
 
 class BaseParser:
     """解析器基类"""
 
+    # 解析所需的页面区域 [(标签名, {属性: 值}), ...]，为None时解析整个页面
+    regions = None
+    # 预处理时从正文中移除的标签
+    strip_tags = ()
+    # 文章被删除或无法查看时页面上的提示文字（找不到正文时检查）
+    unavailable_markers = ()
+
     def __init__(self):
         self.platform_name = '未知'
 
+    def check_available(self, html_content, encoding=None):
+        """页面是“内容已删除”等提示页时抛出 ContentUnavailableError（html_content 可以是原始字节）"""
+        for marker in self.unavailable_markers:
+            if isinstance(html_content, bytes):
+                try:
+                    found = marker.encode(encoding or 'utf-8') in html_content
+                except (LookupError, UnicodeError):
+                    found = False
+            else:
+                found = marker in html_content
+            if found:
+                raise ContentUnavailableError(f"文章已无法查看（{marker}）")
+
+    def parse_only(self):
+        """返回只构建所需区域的SoupStrainer，为None时解析整个页面"""
+        if not self.regions:
+            return None
+        from html2md_soup import RegionStrainer
+        return RegionStrainer(self.regions)
+
     def parse(self, soup):
         """解析页面，返回标题、作者、内容"""
         raise NotImplementedError
 
-    def extract_media(self, content_tag):
-        """提取媒体资源"""
-        media_list = []
-        if not content_tag:
-            return media_list
+    def register_visitors(self, walker, images, videos):
+        """注册正文预处理访问器：移除无用标签、收集媒体资源、补全src
+
+        同一URL只收集一次，重复出现的标签记录在该资源的 tags 中（只下载一次，指向同一个本地文件）。
+        """
+        if self.strip_tags:
+            walker.register(self.strip_tags, remove_tag)
+
+        collected = {}
+
+        def collect(media_type, url, tag, target):
+            media = collected.get(url)
+            if media is None:
+                media = collected[url] = {'type': media_type, 'url': url, 'tags': []}
+                target.append(media)
+            media['tags'].append(tag)
 
-        # 提取图片
-        for img in content_tag.find_all('img'):
+        def collect_image(img):
             img_url = img.get('data-src') or img.get('src') or img.get('data-original')
             if img_url and img_url.startswith('http'):
-                media_list.append({
-                    'type': 'image',
-                    'url': img_url,
-                    'tag': img
-                })
-
-        # 提取视频
-        for video in content_tag.find_all(['video', 'iframe']):
+                collect('image', img_url, img, images)
+
+        def collect_video(video):
             video_url = video.get('data-src') or video.get('src')
             if video_url and video_url.startswith('http'):
-                media_list.append({
-                    'type': 'video',
-                    'url': video_url,
-                    'tag': video
-                })
+                collect('video', video_url, video, videos)
+
+        walker.register(['img'], collect_image)
+        walker.register(['video', 'iframe'], collect_video)
+        walker.register(['img', 'video', 'iframe'], normalize_media_src)
+
+    def extract_media(self, content_tag):
+        """预处理正文并提取媒体资源（单次遍历）"""
+        if not content_tag:
+            return []
+
+        images, videos = [], []
+        walker = ContentWalker()
+        self.register_visitors(walker, images, videos)
+        walker.walk(content_tag)
 
-        return media_list
+        # 图片在前、视频在后，与媒体文件的编号顺序保持一致
+        return images + videos
 
 
 class WechatParser(BaseParser):
     """微信公众号解析器"""
 
+    strip_tags = ('script', 'style')
+    unavailable_markers = (
+        '此内容因违规无法查看',
+        '该内容已被发布者删除',
+        '此内容被投诉且经审核涉嫌侵权，无法查看',
+        '此内容发送失败无法查看',
+    )
+    regions = [
+        ('h1', {'class': 'rich_media_title'}),
+        ('a', {'class': 'rich_media_meta rich_media_meta_link rich_media_meta_nickname'}),
+        ('span', {'class': 'rich_media_meta rich_media_meta_text'}),
+        ('em', {'id': 'publish_time'}),
+        ('div', {'id': 'js_content'}),
+        ('div', {'class': 'rich_media_content'}),
+    ]
+
     def __init__(self):
         super().__init__()
         self.platform_name = '微信公众号'
@@ -120,11 +385,6 @@ class WechatParser(BaseParser):
         if not content:
             content = soup.find('div', class_='rich_media_content')
 
-        if content:
-            # 移除不必要的标签
-            for tag in content.find_all(['script', 'style']):
-                tag.decompose()
-
         return {
             'title': title,
             'author': author,
@@ -136,6 +396,14 @@ class WechatParser(BaseParser):
 class ZhihuParser(BaseParser):
     """知乎解析器"""
 
+    regions = [
+        ('h1', {'class': 'Post-Title'}),
+        ('h1', {'class': 'ArticleItem-title'}),
+        ('meta', {'name': 'author'}),
+        ('div', {'class': 'RichContent-inner'}),
+        ('div', {'class': 'Post-RichTextContainer'}),
+    ]
+
     def __init__(self):
         super().__init__()
         self.platform_name = '知乎'
@@ -168,6 +436,13 @@ class ZhihuParser(BaseParser):
 class JuejinParser(BaseParser):
     """掘金解析器"""
 
+    regions = [
+        ('h1', {'class': 'article-title'}),
+        ('span', {'class': 'username'}),
+        ('article', {'class': 'article-content'}),
+        ('div', {'class': 'markdown-body'}),
+    ]
+
     def __init__(self):
         super().__init__()
         self.platform_name = '掘金'
@@ -198,6 +473,13 @@ class JuejinParser(BaseParser):
 class CSDNParser(BaseParser):
     """CSDN解析器"""
 
+    regions = [
+        ('h1', {'class': 'title-article'}),
+        ('a', {'class': 'follow-nickName'}),
+        ('article', {'class': 'baidu_pl'}),
+        ('div', {'id': 'article_content'}),
+    ]
+
     def __init__(self):
         super().__init__()
         self.platform_name = 'CSDN'
@@ -228,6 +510,10 @@ class CSDNParser(BaseParser):
 class GenericParser(BaseParser):
     """通用解析器"""
 
+    # 计算正文得分时：段落类标签，以及不计入文本的标签
+    PARAGRAPH_TAGS = frozenset({'p', 'pre', 'td'})
+    SKIP_TAGS = frozenset({'script', 'style', 'noscript', 'template'})
+
     def __init__(self):
         super().__init__()
         self.platform_name = '通用网页'
@@ -257,11 +543,9 @@ class GenericParser(BaseParser):
             if content:
                 break
 
-        # 如果都找不到，尝试找最大的div
+        # 如果都找不到，按内容得分选出最可能的正文div
         if not content:
-            all_divs = soup.find_all('div')
-            if all_divs:
-                content = max(all_divs, key=lambda x: len(x.get_text()))
+            content = self.find_main_content(soup)
 
         return {
             'title': title,
@@ -270,80 +554,265 @@ class GenericParser(BaseParser):
             'content': content
         }
 
+    def find_main_content(self, soup):
+        """单次自底向上遍历为节点打分，返回得分最高的div（O(n)）
+
+        每个节点缓存文本长度、链接文本长度和逗号数，子节点先于父节点处理，
+        不再对每个嵌套div重复调用 get_text()。段落（p/pre/td）的得分计入父节点，
+        一半计入祖父节点，div 的最终得分再乘以 (1 - 链接密度)。
+        没有可计分的段落时，选择非链接文本最长的div。
+        """
+        from bs4 import NavigableString, Tag
+
+        stats = {}   # id(tag) -> [文本长度, 链接文本长度, 逗号数]
+        scores = {}  # id(tag) -> 段落累计得分
+        divs = []
+
+        # 文档序的逆序保证子节点先于父节点被处理
+        for node in reversed(list(soup.descendants)):
+            parent = node.parent
+            if isinstance(node, Tag):
+                if node.name in self.SKIP_TAGS:
+                    continue
+                text_len, link_len, commas = stats.setdefault(id(node), [0, 0, 0])
+                if node.name == 'a':
+                    link_len = stats[id(node)][1] = text_len
+                if node.name == 'div':
+                    divs.append(node)
+                if node.name in self.PARAGRAPH_TAGS and text_len >= 25 and parent is not None:
+                    score = 1 + commas + min(text_len // 100, 3)
+                    scores[id(parent)] = scores.get(id(parent), 0) + score
+                    if parent.parent is not None:
+                        grandparent = id(parent.parent)
+                        scores[grandparent] = scores.get(grandparent, 0) + score / 2
+            elif type(node) is NavigableString and parent is not None:
+                text = node.strip()
+                if not text:
+                    continue
+                text_len, link_len, commas = len(text), 0, text.count(',') + text.count('，')
+            else:
+                continue
+
+            if parent is not None:
+                parent_stats = stats.setdefault(id(parent), [0, 0, 0])
+                parent_stats[0] += text_len
+                parent_stats[1] += link_len
+                parent_stats[2] += commas
+
+        if not divs:
+            return None
+        divs.reverse()  # 恢复文档序，得分相同时取靠前（外层）的div
+
+        def content_score(div):
+            text_len, link_len, _ = stats[id(div)]
+            link_density = link_len / text_len if text_len else 0
+            return scores.get(id(div), 0) * (1 - link_density)
+
+        best = max(divs, key=content_score)
+        if content_score(best) > 0:
+            return best
+        return max(divs, key=lambda div: stats[id(div)][0] - stats[id(div)][1])
+
+
+# 注册内置平台
+platform_registry.register('wechat', ['mp.weixin.qq.com'], WechatParser, '微信公众号')
+platform_registry.register('zhihu', ['zhihu.com'], ZhihuParser, '知乎')
+platform_registry.register('xiaohongshu', ['xiaohongshu.com', 'xhslink.com'], None, '小红书')
+platform_registry.register('juejin', ['juejin.cn'], JuejinParser, '掘金')
+platform_registry.register('csdn', ['csdn.net'], CSDNParser, 'CSDN')
+platform_registry.register('generic', [], GenericParser, '通用网页')
+
+
+def configure_markdown(h):
+    """应用Markdown输出选项（SoupMarkdownRenderer 与 html2text.HTML2Text 通用）"""
+    h.ignore_links = False
+    h.ignore_images = False
+    h.ignore_emphasis = False
+    h.body_width = 0
+    h.unicode_snob = True
+    h.skip_internal_links = True
+    return h
+
+
+def __getattr__(name):
+    """按需导入依赖 bs4 / html2text 的类（from html2md import SoupMarkdownRenderer 仍然可用）"""
+    if name in ('RegionStrainer', 'SoupMarkdownRenderer'):
+        import html2md_soup
+        return getattr(html2md_soup, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 class HTML2Markdown:
     """HTML转Markdown主类"""
 
-    def __init__(self, download_media=False):
+    def __init__(self, download_media=False, session=None, keep_alive=True,
+                 media_workers=DEFAULT_MEDIA_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 parser_backend=None, http_cache=None, media_store=None, rate_limits=None,
+                 max_per_host=DEFAULT_MAX_PER_HOST, retry_policy=None,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL):
+        """
+        Args:
+            download_media: 是否下载媒体资源
+            session: 共享的requests.Session（由create_session创建），为None时新建独立连接池
+            keep_alive: 是否复用连接；设为False时回退到 Connection: close（规避HTTP/2问题）
+            media_workers: 媒体下载的工作线程数（1为串行下载）
+            per_host_limit: 单个主机的初始并发请求数（之后按延迟和限流情况自适应调整）
+            parser_backend: BeautifulSoup解析器（lxml / html.parser），为None时使用已安装的最快解析器
+            http_cache: 网页的磁盘缓存（html2md_cache.HTTPCache），为None时不缓存
+            media_store: 跨文章共享的媒体库（html2md_cache.MediaStore），为None时每篇文章单独下载
+            rate_limits: 按主机名后缀限速的规则 {后缀: (每秒请求数, 突发数)}，
+                         为None时使用默认规则，{} 表示不限速；相同规则的转换器共用令牌桶
+            max_per_host: 单个主机自适应并发数的上限
+            retry_policy: 网页获取和媒体下载的重试策略（html2md_net.RetryPolicy），为None时使用默认策略
+            negative_ttl: 永久失败（404、文章已删除等）的URL在多少秒内直接失败、不再请求，0 表示不记录
+        """
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Connection': 'close',  # 强制关闭keep-alive，避免HTTP/2问题
         }
+        if not keep_alive:
+            self.headers['Connection'] = 'close'  # 强制关闭keep-alive，避免HTTP/2问题
         self.download_media = download_media
         self.media_folder = None
         self.media_map = {}
-
-        # 创建Session并禁用HTTP/2
-        self.session = requests.Session()
-        # 强制使用HTTP/1.1
-        from requests.adapters import HTTPAdapter
-        adapter = HTTPAdapter(max_retries=3)
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
-
-        # 注册所有解析器
-        self.parsers = {
-            'wechat': WechatParser(),
-            'zhihu': ZhihuParser(),
-            'juejin': JuejinParser(),
-            'csdn': CSDNParser(),
-            'generic': GenericParser()
-        }
+        self.media_workers = max(1, media_workers)
+        self.per_host_limit = max(1, per_host_limit)
+        self.parser_backend = parser_backend or detect_parser_backend()
+        self.http_cache = http_cache
+        self.media_store = media_store
+        from html2md_net import DEFAULT_RETRY_POLICY, get_host_concurrency, get_rate_limiter, negative_cache
+        self.rate_limiter = get_rate_limiter(rate_limits)
+        self.negative_cache = negative_cache
+        self.negative_ttl = negative_ttl
+        self.retry_policy = retry_policy or DEFAULT_RETRY_POLICY
+        self.retries = 0  # 本实例累计的重试次数
+        self._retries_lock = threading.Lock()
+        # 各主机的并发数在进程内共享，随延迟和 429/503 自适应调整，连续失败的主机熔断
+        self.concurrency = get_host_concurrency(self.per_host_limit, max_per_host)
+
+        # 复用外部连接池；未提供时在首次请求时创建本实例独享的连接池
+        self._session = session
+
+        # 各平台的解析器实例，首次使用时创建
+        self.parsers = {}
+
+    def get_parser(self, platform):
+        """获取平台的解析器（未注册解析器的平台使用通用解析器）"""
+        parser = self.parsers.get(platform)
+        if parser is None:
+            parser = self.parsers[platform] = platform_registry.get_parser_class(platform)()
+        return parser
+
+    @property
+    def session(self):
+        """HTTP会话（首次使用时创建）"""
+        if self._session is None:
+            self._session = create_session()
+        return self._session
 
     def fetch_page(self, url):
-        """获取网页内容"""
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
+        """获取网页内容（解码后的文本）"""
+        content, encoding = self.fetch_document(url)
+        return str(content, encoding, errors='replace')
+
+    def fetch_document(self, url):
+        """获取网页的原始字节和编码（启用缓存时先发送条件请求，未修改则使用缓存）
+
+        Returns:
+            (原始字节, 编码)；字节不解码，直接交给 parse_article
+        """
+        from html2md_net import detect_encoding
+
+        headers = self.headers
+        cached = self.http_cache.get(url) if self.http_cache else None
+        if cached:
+            headers = {**self.headers, **self.http_cache.conditional_headers(cached)}
+
+        def request(headers):
+            self.rate_limiter.wait(url)
+            with self.concurrency.slot(url) as slot:
                 # 使用更兼容的配置
                 response = self.session.get(
                     url,
-                    headers=self.headers,
+                    headers=headers,
                     timeout=30,
                     verify=True,
                     allow_redirects=True
                 )
+                slot.done(response.status_code)
+            if response.status_code != 304:
                 response.raise_for_status()
-                response.encoding = response.apparent_encoding or 'utf-8'
-                return response.text
-            except Exception as e:
-                error_msg = str(e)
-                # 特殊处理HTTP/2 StreamReset错误
-                if 'StreamReset' in error_msg or 'stream_id' in error_msg:
-                    print(f"警告: HTTP/2连接错误 (尝试 {attempt + 1}/{max_retries}): {e}")
-                    if attempt < max_retries - 1:
-                        import time
-                        time.sleep(1)  # 等待1秒后重试
-                        continue
-                print(f"错误: 无法获取网页内容 - {e}")
-                if attempt == max_retries - 1:
-                    raise  # 最后一次尝试失败时抛出异常
-        return None
+            return response
 
-    def download_file(self, url, save_path):
-        """下载单个文件"""
         try:
-            response = self.session.get(url, headers=self.headers, timeout=30, stream=True)
-            response.raise_for_status()
+            response = self.retry_policy.call(request, headers, on_retry=self._on_retry('获取网页'))
+            if response.status_code == 304 and cached:
+                content = self.http_cache.load_body(url)
+                if content is not None:
+                    print("✓ 网页未修改，使用缓存")
+                    return content, cached.get('encoding') or detect_encoding(content)
+                # 缓存文件已被淘汰，重新完整获取
+                response = self.retry_policy.call(request, self.headers, on_retry=self._on_retry('获取网页'))
+        except Exception as e:
+            print(f"错误: 无法获取网页内容 - {e}")
+            raise
+
+        # 按 Content-Type / BOM / <meta charset> 确定编码，不再对整个网页做统计检测（apparent_encoding）
+        content = response.content
+        encoding = detect_encoding(content, response.headers.get('Content-Type'))
+        if self.http_cache and 'no-store' not in response.headers.get('Cache-Control', ''):
+            self.http_cache.put(
+                url, content, encoding,
+                etag=response.headers.get('ETag'),
+                last_modified=response.headers.get('Last-Modified')
+            )
+        return content, encoding
+
+    def check_negative_cache(self, url):
+        """近期已永久失败的URL直接失败，不再请求"""
+        reason = self.negative_cache.get(url) if self.negative_ttl else None
+        if reason:
+            raise ConversionError(f"近期已失败，暂不重试 - {reason}")
+
+    def remember_failure(self, url, error):
+        """记录永久失败（404 / 410 / 451、文章已删除），有效期内不再请求该URL"""
+        from html2md_net import is_permanent_failure
+        if self.negative_ttl and is_permanent_failure(error):
+            self.negative_cache.put(url, str(error), self.negative_ttl)
+
+    def _on_retry(self, action, indent=''):
+        """生成重试回调：累计重试次数并输出提示"""
+        def on_retry(attempt, delay, error):
+            with self._retries_lock:
+                self.retries += 1
+            print(f"{indent}警告: {action}失败（第 {attempt} 次），{delay:.1f} 秒后重试 - {error}")
+        return on_retry
+
+    def download_file(self, url, save_path):
+        """下载单个文件（临时故障按重试策略重试）"""
+        reason = self.negative_cache.get(url) if self.negative_ttl else None
+        if reason:
+            print(f"  警告: 跳过 {url} - 近期已失败: {reason}")
+            return False
+
+        def download():
+            self.rate_limiter.wait(url)
+            with self.concurrency.slot(url) as slot:
+                response = self.session.get(url, headers=self.headers, timeout=30, stream=True)
+                slot.done(response.status_code)
+                response.raise_for_status()
 
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                with replace_file(save_path) as f:
+                    for chunk in response.iter_content(chunk_size=8192):
+                        if chunk:
+                            f.write(chunk)
+
+        try:
+            self.retry_policy.call(download, on_retry=self._on_retry(f"下载 {url} ", indent='  '))
             return True
         except Exception as e:
+            self.remember_failure(url, e)
             print(f"  警告: 下载失败 {url} - {e}")
             return False
 
@@ -352,6 +821,48 @@ class HTML2Markdown:
         if not media_list:
             return
 
+        media_folder_name, tasks = self.plan_media_downloads(media_list, base_name)
+        total = len(tasks)
+        print(f"\n开始下载媒体资源 (共 {total} 个, 并发 {min(self.media_workers, total)})...")
+
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        results = {}
+        progress = {'done': 0, 'reused': 0}
+        progress_lock = threading.Lock()
+
+        def run(task):
+            idx, media, filename = task
+            save_path = os.path.join(self.media_folder, filename)
+            reused = self.media_store is not None and self.media_store.restore(media['url'], save_path)
+            if reused:
+                ok = True
+            else:
+                ok = self.download_file(media['url'], save_path)
+                if ok and self.media_store is not None:
+                    self.media_store.add(media['url'], save_path)
+            with progress_lock:
+                progress['done'] += 1
+                progress['reused'] += reused
+                self.report_media_progress(progress['done'], total, media, filename, ok)
+            return idx, ok
+
+        with ThreadPoolExecutor(max_workers=min(self.media_workers, total)) as executor:
+            # 工作线程沿用调用方的上下文（后台服务据此把进度输出转发给对应的客户端）
+            futures = [executor.submit(contextvars.copy_context().run, run, task) for task in tasks]
+            for future in as_completed(futures):
+                idx, ok = future.result()
+                results[idx] = ok
+
+        self.apply_media_results(media_folder_name, tasks, results)
+        self.finish_media_store(progress['reused'])
+
+    def plan_media_downloads(self, media_list, base_name):
+        """创建媒体文件夹，并按原始顺序分配文件名
+
+        Returns:
+            (媒体文件夹名, [(序号, 媒体, 文件名), ...])
+        """
         # 创建媒体文件夹
         self.media_folder = f"{base_name}_files"
         Path(self.media_folder).mkdir(parents=True, exist_ok=True)
@@ -359,21 +870,27 @@ class HTML2Markdown:
         # 提取文件夹的basename（用于相对路径）
         media_folder_name = os.path.basename(base_name) + "_files"
 
-        print(f"\n开始下载媒体资源 (共 {len(media_list)} 个)...")
-
-        downloaded = 0
+        # 预先按原始顺序分配文件名，保证 image_001.jpg 等命名与串行下载一致
+        tasks = []
         for idx, media in enumerate(media_list, 1):
-            url = media['url']
             media_type = media['type']
-
-            # 生成文件名
-            ext = self.get_file_extension(url, media_type)
+            ext = self.get_file_extension(media['url'], media_type)
             filename = f"{media_type}_{idx:03d}{ext}"
-            save_path = os.path.join(self.media_folder, filename)
+            tasks.append((idx, media, filename))
+
+        return media_folder_name, tasks
 
-            # 下载文件
-            print(f"  [{idx}/{len(media_list)}] 下载 {media_type}: {filename}")
-            if self.download_file(url, save_path):
+    def report_media_progress(self, done, total, media, filename, ok):
+        """输出媒体下载进度"""
+        status = '✓' if ok else '✗'
+        print(f"  [{done}/{total}] {status} {media['type']}: {filename}")
+
+    def apply_media_results(self, media_folder_name, tasks, results):
+        """按原始顺序写入URL映射，保证结果与串行下载时一致"""
+        downloaded = 0
+        for idx, media, filename in tasks:
+            url = media['url']
+            if results.get(idx):
                 # 保存URL映射（使用相对路径）
                 relative_path = os.path.join(media_folder_name, filename)
                 self.media_map[url] = relative_path
@@ -382,7 +899,15 @@ class HTML2Markdown:
                 # 如果下载失败，仍然使用原始URL
                 self.media_map[url] = url
 
-        print(f"✓ 下载完成: {downloaded}/{len(media_list)} 个文件")
+        print(f"✓ 下载完成: {downloaded}/{len(tasks)} 个文件")
+
+    def finish_media_store(self, reused):
+        """保存媒体库索引，并输出从媒体库复用的文件数"""
+        if self.media_store is None:
+            return
+        self.media_store.save()
+        if reused:
+            print(f"  其中 {reused} 个文件来自媒体库，未重新下载")
 
     def get_file_extension(self, url, media_type):
         """获取文件扩展名"""
@@ -407,37 +932,20 @@ class HTML2Markdown:
         if not html_content:
             return ""
 
-        # 处理所有img标签：将data-src复制到src
-        for img in html_content.find_all('img'):
-            if img.get('data-src') and not img.get('src'):
-                img['src'] = img['data-src']
-            elif img.get('data-original') and not img.get('src'):
-                img['src'] = img['data-original']
-
-        # 处理所有video/iframe标签
-        for video in html_content.find_all(['video', 'iframe']):
-            if video.get('data-src') and not video.get('src'):
-                video['src'] = video['data-src']
+        # data-src 等懒加载属性已在 extract_media 的预处理遍历中补全到src
 
         # 如果下载了媒体，替换HTML中的链接为本地路径
         if self.download_media and self.media_map:
             for media in media_list:
-                url = media['url']
-                tag = media['tag']
-                if url in self.media_map:
-                    local_path = self.media_map[url]
-                    # 更新标签的src属性为本地路径
-                    tag['src'] = local_path
-
-        h = html2text.HTML2Text()
-        h.ignore_links = False
-        h.ignore_images = False
-        h.ignore_emphasis = False
-        h.body_width = 0
-        h.unicode_snob = True
-        h.skip_internal_links = True
-
-        return h.handle(str(html_content))
+                local_path = self.media_map.get(media['url'])
+                if local_path:
+                    # 更新所有引用该资源的标签的src属性为本地路径
+                    for tag in media['tags']:
+                        tag['src'] = local_path
+
+        # 直接遍历已解析的DOM树生成Markdown，不再序列化成HTML字符串后交给html2text重新解析
+        from html2md_soup import SoupMarkdownRenderer
+        return configure_markdown(SoupMarkdownRenderer()).render(html_content)
 
     def clean_markdown(self, markdown_text):
         """清理Markdown文本"""
@@ -480,28 +988,69 @@ class HTML2Markdown:
             Path(filepath).write_text(content, encoding='utf-8')
             print(f"✓ 文章已保存到: {filepath}")
         except Exception as e:
-            print(f"错误: 保存文件失败 - {e}")
-            sys.exit(1)
+            raise ConversionError(f"保存文件失败 - {e}") from e
 
     def convert(self, url, output_path=None, output_dir='output'):
         """主转换流程"""
         print(f"正在获取网页: {url}")
+        self.check_negative_cache(url)
 
         # 检测平台
         platform = PlatformDetector.detect(url)
         platform_name = PlatformDetector.get_platform_name(platform)
         print(f"检测到平台: {platform_name}")
 
-        # 获取网页内容
-        html_content = self.fetch_page(url)
-        if not html_content:
-            print("错误: 无法获取网页内容")
-            sys.exit(1)
+        try:
+            # 获取网页内容
+            html_content, encoding = self.fetch_document(url)
+            if not html_content:
+                raise ConversionError("无法获取网页内容")
 
-        # 解析页面
-        soup = BeautifulSoup(html_content, 'html.parser')
-        parser = self.parsers.get(platform, self.parsers['generic'])
-        article = parser.parse(soup)
+            # 解析页面
+            article, media_list = self.parse_article(html_content, platform, output_dir, encoding)
+        except Exception as e:
+            self.remember_failure(url, e)
+            raise
+        output_path = self.resolve_output_path(article, url, output_path, output_dir)
+
+        # 下载媒体资源（如果需要）
+        if self.download_media and media_list:
+            base_name = os.path.splitext(output_path)[0]
+            self.download_media_files(media_list, base_name)
+
+        # 构建并保存Markdown
+        final_markdown = self.build_markdown(article, media_list, platform_name, url)
+        self.save_markdown(final_markdown, output_path)
+
+        return output_path
+
+    def parse_article(self, html_content, platform, output_dir='output', encoding=None):
+        """解析页面并提取媒体资源
+
+        Args:
+            html_content: 网页文本，或原始字节（直接交给解析器解码，不再先解码成完整的字符串）
+            encoding: html_content 为字节时的编码，为None时由 BeautifulSoup 检测
+
+        Returns:
+            (文章信息字典, 媒体资源列表)
+        """
+        from bs4 import BeautifulSoup
+
+        platform_name = PlatformDetector.get_platform_name(platform)
+        parser = self.get_parser(platform)
+
+        # 只构建解析器需要的区域（跳过侧栏、推荐列表等），找不到正文时再解析整个页面
+        strainer = parser.parse_only()
+        options = {'from_encoding': encoding} if isinstance(html_content, bytes) and encoding else {}
+        article = None
+        if strainer is not None:
+            soup = BeautifulSoup(html_content, self.parser_backend, parse_only=strainer, **options)
+            article = parser.parse(soup)
+        if article is None or not article['content']:
+            # 已删除的文章不必再完整解析，也不保存 debug.html
+            parser.check_available(html_content, encoding)
+            soup = BeautifulSoup(html_content, self.parser_backend, **options)
+            article = parser.parse(soup)
 
         if not article['content']:
             print(f"警告: 未能找到文章内容")
@@ -509,9 +1058,12 @@ class HTML2Markdown:
             # 保存原始HTML用于调试
             debug_file = Path(output_dir) / 'debug.html'
             debug_file.parent.mkdir(exist_ok=True)
-            debug_file.write_text(html_content, encoding='utf-8')
+            if isinstance(html_content, bytes):
+                debug_file.write_bytes(html_content)
+            else:
+                debug_file.write_text(html_content, encoding='utf-8')
             print(f"已保存原始HTML到: {debug_file}（可用于调试）")
-            sys.exit(1)
+            raise ConversionError("未能找到文章内容")
 
         print(f"✓ 成功解析文章")
         if article['title']:
@@ -526,7 +1078,10 @@ class HTML2Markdown:
             video_count = sum(1 for m in media_list if m['type'] == 'video')
             print(f"✓ 找到 {len(media_list)} 个媒体资源 (图片: {image_count}, 视频: {video_count})")
 
-        # 确定输出路径
+        return article, media_list
+
+    def resolve_output_path(self, article, url, output_path=None, output_dir='output'):
+        """确定输出路径（并创建所需目录）"""
         if not output_path:
             output_dir_path = Path(output_dir)
             output_dir_path.mkdir(exist_ok=True)
@@ -534,13 +1089,10 @@ class HTML2Markdown:
             output_path = str(output_path)
         else:
             Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+        return output_path
 
-        # 下载媒体资源（如果需要）
-        if self.download_media and media_list:
-            base_name = os.path.splitext(output_path)[0]
-            self.download_media_files(media_list, base_name)
-
-        # 构建Markdown内容
+    def build_markdown(self, article, media_list, platform_name, url):
+        """构建完整的Markdown内容（标题、元数据和正文）"""
         markdown_parts = []
 
         if article['title']:
@@ -563,15 +1115,181 @@ class HTML2Markdown:
         content_md = self.clean_markdown(content_md)
         markdown_parts.append(content_md)
 
-        final_markdown = "\n".join(markdown_parts)
+        return "\n".join(markdown_parts)
 
-        # 保存文件
-        self.save_markdown(final_markdown, output_path)
 
-        return output_path
+def convert_url(url, output_path=None, output_dir='output', **options):
+    """转换单个URL并返回输出路径
+
+    参数和返回值都可以pickle，可直接作为进程池任务提交；同一进程内的调用共享连接池。
+    options 会传给 HTML2Markdown（如 download_media、media_workers）；cache_dir 启用网页磁盘缓存，
+    media_store_dir 启用跨文章共享的媒体库。
+    """
+    options.setdefault('session', get_shared_session())
+    cache_dir = options.pop('cache_dir', None)
+    if cache_dir:
+        from html2md_cache import get_http_cache
+        options.setdefault('http_cache', get_http_cache(cache_dir))
+    media_store_dir = options.pop('media_store_dir', None)
+    if media_store_dir:
+        from html2md_cache import get_media_store
+        options.setdefault('media_store', get_media_store(media_store_dir))
+    converter = HTML2Markdown(**options)
+    return converter.convert(url, output_path, output_dir)
+
+
+class _LinePrefixer:
+    """并发转换时的标准输出包装：按线程缓冲到整行再输出，并加上各自的前缀"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+    def set_prefix(self, prefix):
+        """设置当前线程的输出前缀"""
+        self.local.prefix = prefix
+        self.local.buffer = ''
+
+    def write(self, text):
+        prefix = getattr(self.local, 'prefix', '')
+        buffer = getattr(self.local, 'buffer', '') + text
+        *lines, self.local.buffer = buffer.split('\n')
+        if lines:
+            output = ''.join(f"{prefix}{line}\n" if line.strip() else '\n' for line in lines)
+            with self.lock:
+                self.stream.write(output)
+        return len(text)
+
+    def flush(self):
+        with self.lock:
+            self.stream.flush()
+
+
+class OutputRouter:
+    """后台服务的标准输出：写到当前上下文所属客户端的连接，未设置时写到原来的标准输出
+
+    多个请求在不同线程中并发执行，输出目标保存在 ContextVar 中，互不干扰。
+    """
+
+    target = contextvars.ContextVar('html2md_output', default=None)
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def current(self):
+        return self.target.get() or self.stream
+
+    def write(self, text):
+        return self.current().write(text)
+
+    def flush(self):
+        self.current().flush()
+
+
+def current_output():
+    """当前上下文实际写入的输出流"""
+    if isinstance(sys.stdout, OutputRouter):
+        return sys.stdout.current()
+    return sys.stdout
+
+
+@contextmanager
+def redirect_output(stream):
+    """在当前上下文中把标准输出换成stream（为None时不变）"""
+    if stream is None:
+        yield
+    elif isinstance(sys.stdout, OutputRouter):
+        token = OutputRouter.target.set(stream)
+        try:
+            yield
+        finally:
+            OutputRouter.target.reset(token)
+    else:
+        saved = sys.stdout
+        sys.stdout = stream
+        try:
+            yield
+        finally:
+            sys.stdout = saved
+
+
+def read_urls(args):
+    """汇总命令行、--input 文件和标准输入中的URL（忽略空行和 # 注释，去除重复）"""
+    urls = list(args.urls)
+    sources = list(args.input or [])
+    if not urls and not sources and not sys.stdin.isatty():
+        sources.append('-')
+
+    for source in sources:
+        if source == '-':
+            lines = sys.stdin.read().splitlines()
+        else:
+            lines = Path(source).read_text(encoding='utf-8').splitlines()
+        urls.extend(line.strip() for line in lines)
+
+    seen = set()
+    result = []
+    for url in urls:
+        if url and not url.startswith('#') and url not in seen:
+            seen.add(url)
+            result.append(url)
+    return result
+
+
+def convert_batch(urls, converter_options, output_dir='output', jobs=1):
+    """并发转换多个URL（共享连接池），返回 [(url, 输出路径, 错误信息, 耗时, 重试次数), ...]"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    def convert_one(index, url):
+        if prefixer:
+            prefixer.set_prefix(f"[{index}] ")
+        started = time.monotonic()
+        converter = HTML2Markdown(**converter_options)
+        try:
+            output_path = converter.convert(url, None, output_dir)
+            return url, output_path, None, time.monotonic() - started, converter.retries
+        except Exception as e:
+            print(f"错误: {e}")
+            return url, None, str(e), time.monotonic() - started, converter.retries
+
+    prefixer = _LinePrefixer(current_output()) if jobs > 1 else None
+    with redirect_output(prefixer):
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, convert_one, index, url)
+                for index, url in enumerate(urls, 1)
+            ]
+            return [future.result() for future in futures]
+
+
+def print_summary(results, wall_time):
+    """输出批量转换汇总表"""
+    succeeded = sum(1 for _, output_path, _, _, _ in results if output_path)
+    total_time = sum(elapsed for _, _, _, elapsed, _ in results)
+    total_retries = sum(retries for _, _, _, _, retries in results)
+
+    print("\n" + "=" * 60)
+    print(f"批量转换完成: 成功 {succeeded}/{len(results)}，失败 {len(results) - succeeded}")
+    print("=" * 60)
+    print(f"{'#':>3}  状态  {'':>3}耗时  重试  URL")
+    for index, (url, output_path, error, elapsed, retries) in enumerate(results, 1):
+        status = '✓' if output_path else '✗'
+        print(f"{index:>3}  {status:<4}  {elapsed:>6.2f}s  {retries:>4}  {url}")
+        print(f"{'':>28}{output_path or '错误: ' + error}")
+    print("=" * 60)
+    print(f"总耗时: {wall_time:.2f}s（各文章累计 {total_time:.2f}s），重试 {total_retries} 次")
 
 
 def main():
+    # html2md.py serve：启动常驻后台服务
+    if sys.argv[1:2] == ['serve']:
+        from html2md_daemon import serve_main
+        serve_main(sys.argv[2:])
+        return
+
+    import argparse
+
     parser = argparse.ArgumentParser(
         description='HTML转Markdown统一工具 - 支持微信公众号、知乎、掘金、CSDN等多个平台',
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -598,20 +1316,150 @@ def main():
 
   # 指定输出文件
   %(prog)s https://xxxx -o my_article.md -d
+
+  # 批量转换（4个并发），URL来自命令行、文件或标准输入
+  %(prog)s URL1 URL2 URL3 -j 4
+  %(prog)s --input urls.txt -j 4 -d
+  cat urls.txt | %(prog)s -j 4
+
+  # 启动常驻后台服务，之后的转换自动交给它执行（省去启动和建连耗时）
+  %(prog)s serve --socket
         """
     )
 
-    parser.add_argument('url', help='网页URL')
-    parser.add_argument('-o', '--output', help='输出文件路径（可选，默认保存到output目录）')
+    parser.add_argument('urls', nargs='*', metavar='url', help='网页URL（可指定多个）')
+    parser.add_argument('-V', '--version', action='version', version=f'%(prog)s {__version__}')
+    parser.add_argument('-i', '--input', action='append', metavar='FILE',
+                        help='从文件读取URL，每行一个（可重复指定，- 表示标准输入）')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='批量转换时同时转换的文章数（默认: 1）')
+    parser.add_argument('-o', '--output', help='输出文件路径（可选，默认保存到output目录；仅限单个URL）')
     parser.add_argument('-d', '--download', action='store_true',
                         help='下载图片和视频到本地（默认只保留在线链接）')
     parser.add_argument('--output-dir', default='output',
                         help='输出目录（默认: output）')
+    parser.add_argument('--no-keep-alive', action='store_true',
+                        help='禁用连接复用（每个请求使用 Connection: close，用于规避HTTP/2连接错误）')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_MAXSIZE,
+                        help=f'每个主机的最大连接数（默认: {DEFAULT_POOL_MAXSIZE}）')
+    parser.add_argument('--parser', choices=PARSER_BACKENDS, default=None,
+                        help='HTML解析器（默认: 已安装的最快解析器，lxml 优先）')
+    parser.add_argument('--workers', type=int, default=DEFAULT_MEDIA_WORKERS,
+                        help=f'媒体下载并发数（默认: {DEFAULT_MEDIA_WORKERS}，1为串行）')
+    parser.add_argument('--per-host', type=int, default=DEFAULT_PER_HOST_LIMIT,
+                        help=f'单个主机的初始并发请求数，之后按延迟和 429/503 自适应调整（默认: {DEFAULT_PER_HOST_LIMIT}）')
+    parser.add_argument('--max-per-host', type=int, default=DEFAULT_MAX_PER_HOST,
+                        help=f'单个主机自适应并发数的上限（默认: {DEFAULT_MAX_PER_HOST}）')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='启用网页磁盘缓存：再次转换时发送条件请求，网页未修改（304）则不重新下载')
+    parser.add_argument('--cache-size', type=int, default=256, metavar='MB',
+                        help='网页缓存的容量上限，超出时淘汰最久未用的网页（默认: 256）')
+    parser.add_argument('--media-store', metavar='DIR',
+                        help='跨文章共享的媒体库：按内容（SHA-256）去重保存下载的图片和视频，已下载过的URL不再重复下载')
+    parser.add_argument('--rate-limit', action='append', default=[], metavar='HOST=RATE[:BURST]',
+                        help='按主机名后缀限速，如 mp.weixin.qq.com=2:5（每秒2个请求，最多连发5个）；'
+                             '可多次指定，覆盖默认规则，RATE为0表示不限速')
+    parser.add_argument('--no-rate-limit', action='store_true',
+                        help='不限速（默认对微信公众号、微信图片CDN和CSDN限速）')
+    parser.add_argument('--socket', default=None, metavar='PATH',
+                        help='后台服务的Unix套接字路径（默认: $HTML2MD_SOCKET，未设置时为 $XDG_RUNTIME_DIR/html2md.sock，'
+                             '都未设置时为临时目录下的 html2md-<uid>.sock）')
+    parser.add_argument('--no-daemon', action='store_true',
+                        help='不使用后台服务，始终在当前进程中转换')
 
     args = parser.parse_args()
 
-    converter = HTML2Markdown(download_media=args.download)
-    converter.convert(args.url, args.output, args.output_dir)
+    urls = read_urls(args)
+    if not urls:
+        parser.error('请提供至少一个URL（命令行参数、--input 文件或标准输入）')
+    if args.output and len(urls) > 1:
+        parser.error('-o/--output 只能用于单个URL，批量转换请使用 --output-dir')
+
+    rate_limits = None  # 默认规则
+    if args.no_rate_limit:
+        rate_limits = {}
+    elif args.rate_limit:
+        from html2md_net import DEFAULT_RATE_LIMITS, parse_rate_limits
+        try:
+            rate_limits = {**DEFAULT_RATE_LIMITS, **parse_rate_limits(args.rate_limit)}
+        except ValueError as e:
+            parser.error(str(e))
+
+    request = {
+        'urls': urls,
+        'output': args.output,
+        'output_dir': args.output_dir,
+        'jobs': max(1, args.jobs),
+        'pool_size': args.pool_size,
+        'download_media': args.download,
+        'keep_alive': not args.no_keep_alive,
+        'media_workers': args.workers,
+        'per_host_limit': args.per_host,
+        'max_per_host': args.max_per_host,
+        'parser_backend': args.parser,
+        'cache_dir': args.cache_dir,
+        'cache_size': args.cache_size,
+        'media_store_dir': args.media_store,
+        'rate_limits': rate_limits
+    }
+
+    # 后台服务在运行时交给它转换（复用已导入的模块和连接池），否则在当前进程中转换
+    if not args.no_daemon:
+        from html2md_daemon import forward
+        exit_code = forward(request, args.socket)
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+    sys.exit(run_conversions(request))
+
+
+def run_conversions(request, session=None):
+    """执行一次命令行转换请求（单个URL或批量），返回退出码
+
+    Args:
+        request: main() 根据命令行参数构建的请求字典
+        session: 共享的requests.Session，为None时按 pool_size 新建
+    """
+    if session is None:
+        session = create_session(pool_maxsize=max(request['pool_size'], request['jobs']))
+    http_cache = None
+    if request.get('cache_dir'):
+        from html2md_cache import get_http_cache
+        http_cache = get_http_cache(request['cache_dir'], request['cache_size'] * 1024 * 1024)
+    media_store = None
+    if request.get('media_store_dir'):
+        from html2md_cache import get_media_store
+        media_store = get_media_store(request['media_store_dir'])
+    converter_options = {
+        'download_media': request['download_media'],
+        'session': session,
+        'keep_alive': request['keep_alive'],
+        'media_workers': request['media_workers'],
+        'per_host_limit': request['per_host_limit'],
+        'max_per_host': request['max_per_host'],
+        'parser_backend': request['parser_backend'],
+        'http_cache': http_cache,
+        'media_store': media_store,
+        'rate_limits': request.get('rate_limits')
+    }
+
+    urls = request['urls']
+    if len(urls) == 1:
+        from html2md_net import CircuitOpenError
+
+        converter = HTML2Markdown(**converter_options)
+        try:
+            converter.convert(urls[0], request['output'], request['output_dir'])
+        except (ConversionError, CircuitOpenError, OSError) as e:
+            # OSError 包括 requests 的 HTTPError / ConnectionError / Timeout
+            print(f"错误: {e}")
+            return 1
+        return 0
+
+    started = time.monotonic()
+    results = convert_batch(urls, converter_options, request['output_dir'], request['jobs'])
+    print_summary(results, time.monotonic() - started)
+    return 1 if any(error for _, _, error, _, _ in results) else 0
 
 
 if __name__ == '__main__':
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+HTML转Markdown异步版本
+基于 asyncio + httpx，单个进程可同时处理大量转换任务
+"""
+
+import asyncio
+import functools
+import os
+
+import httpx
+
+from html2md import (
+    HTML2Markdown, PlatformDetector, ConversionError, replace_file,
+    DEFAULT_POOL_MAXSIZE, DEFAULT_MEDIA_WORKERS, DEFAULT_PER_HOST_LIMIT, DEFAULT_MAX_PER_HOST,
+    DEFAULT_NEGATIVE_TTL
+)
+
+# 异步连接池默认配置：总连接数上限，以及保持空闲的keep-alive连接数
+DEFAULT_MAX_CONNECTIONS = 100
+
+
+def create_async_client(max_connections=DEFAULT_MAX_CONNECTIONS,
+                        max_keepalive_connections=DEFAULT_POOL_MAXSIZE):
+    """创建带连接池的httpx.AsyncClient（可在多个AsyncHTML2Markdown实例间共享）"""
+    limits = httpx.Limits(
+        max_connections=max_connections,
+        max_keepalive_connections=max_keepalive_connections
+    )
+    return httpx.AsyncClient(limits=limits, timeout=30, follow_redirects=True)
+
+
+class AsyncHTML2Markdown(HTML2Markdown):
+    """HTML转Markdown异步主类
+
+    解析和Markdown渲染逻辑与 HTML2Markdown 共用，网页获取和媒体下载使用异步HTTP客户端。
+    """
+
+    def __init__(self, download_media=False, client=None, keep_alive=True,
+                 media_workers=DEFAULT_MEDIA_WORKERS, per_host_limit=DEFAULT_PER_HOST_LIMIT,
+                 executor=None, parser_backend=None, media_store=None, rate_limits=None,
+                 max_per_host=DEFAULT_MAX_PER_HOST, retry_policy=None,
+                 negative_ttl=DEFAULT_NEGATIVE_TTL):
+        """
+        Args:
+            download_media: 是否下载媒体资源
+            client: 共享的httpx.AsyncClient（由create_async_client创建），为None时在首次请求时创建
+            keep_alive: 是否复用连接；设为False时回退到 Connection: close（规避HTTP/2问题）
+            media_workers: 媒体下载的最大并发数
+            per_host_limit: 单个主机的初始并发请求数（之后自适应调整）
+            executor: 执行解析和渲染的线程池，为None时使用事件循环的默认线程池
+            parser_backend: BeautifulSoup解析器（lxml / html.parser），为None时使用已安装的最快解析器
+            media_store: 跨文章共享的媒体库（html2md_cache.MediaStore），为None时每篇文章单独下载
+            rate_limits: 按主机名后缀限速的规则，与 HTML2Markdown 相同
+            max_per_host: 单个主机自适应并发数的上限
+            retry_policy: 网页获取和媒体下载的重试策略，为None时使用默认策略
+            negative_ttl: 永久失败的URL在多少秒内直接失败、不再请求，0 表示不记录
+        """
+        super().__init__(download_media=download_media, keep_alive=keep_alive,
+                         media_workers=media_workers, per_host_limit=per_host_limit,
+                         parser_backend=parser_backend, media_store=media_store,
+                         rate_limits=rate_limits, max_per_host=max_per_host,
+                         retry_policy=retry_policy, negative_ttl=negative_ttl)
+        self._client = client
+        self._owns_client = client is None
+        self.executor = executor
+
+    @property
+    def client(self):
+        """异步HTTP客户端（首次使用时创建）"""
+        if self._client is None:
+            self._client = create_async_client()
+        return self._client
+
+    async def aclose(self):
+        """关闭本实例创建的HTTP客户端（共享客户端由调用方负责关闭）"""
+        if self._owns_client and self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def _run_blocking(self, func, *args):
+        """在线程池中执行CPU密集的同步步骤，避免阻塞事件循环"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args))
+
+    async def fetch_page(self, url):
+        """获取网页内容（解码后的文本）"""
+        content, encoding = await self.fetch_document(url)
+        return str(content, encoding, errors='replace')
+
+    async def fetch_document(self, url):
+        """获取网页的原始字节和编码"""
+        from html2md_net import detect_encoding
+
+        async def request():
+            await asyncio.sleep(self.rate_limiter.reserve(url))
+            async with self.concurrency.aslot(url) as slot:
+                response = await self.client.get(url, headers=self.headers)
+                slot.done(response.status_code)
+            response.raise_for_status()
+            return response
+
+        try:
+            response = await self.retry_policy.acall(request, on_retry=self._on_retry('获取网页'))
+        except Exception as e:
+            print(f"错误: 无法获取网页内容 - {e}")
+            raise
+        content = response.content
+        return content, detect_encoding(content, response.headers.get('Content-Type'))
+
+    async def download_file(self, url, save_path):
+        """下载单个文件（临时故障按重试策略重试）"""
+        reason = self.negative_cache.get(url) if self.negative_ttl else None
+        if reason:
+            print(f"  警告: 跳过 {url} - 近期已失败: {reason}")
+            return False
+
+        async def download():
+            await asyncio.sleep(self.rate_limiter.reserve(url))
+            async with self.concurrency.aslot(url) as slot, \
+                    self.client.stream('GET', url, headers=self.headers) as response:
+                slot.done(response.status_code)
+                response.raise_for_status()
+                with replace_file(save_path) as f:
+                    async for chunk in response.aiter_bytes(chunk_size=8192):
+                        if chunk:
+                            f.write(chunk)
+
+        try:
+            await self.retry_policy.acall(download, on_retry=self._on_retry(f"下载 {url} ", indent='  '))
+            return True
+        except Exception as e:
+            self.remember_failure(url, e)
+            print(f"  警告: 下载失败 {url} - {e}")
+            return False
+
+    async def download_media_files(self, media_list, base_name):
+        """批量并发下载媒体文件"""
+        if not media_list:
+            return
+
+        media_folder_name, tasks = self.plan_media_downloads(media_list, base_name)
+        total = len(tasks)
+        print(f"\n开始下载媒体资源 (共 {total} 个, 并发 {min(self.media_workers, total)})...")
+
+        workers = asyncio.Semaphore(self.media_workers)
+        progress = {'done': 0, 'reused': 0}
+        store = self.media_store
+
+        async def run(task):
+            idx, media, filename = task
+            save_path = os.path.join(self.media_folder, filename)
+            reused = store is not None and await self._run_blocking(store.restore, media['url'], save_path)
+            if reused:
+                ok = True
+            else:
+                async with workers:
+                    ok = await self.download_file(media['url'], save_path)
+                if ok and store is not None:
+                    await self._run_blocking(store.add, media['url'], save_path)
+            progress['done'] += 1
+            progress['reused'] += reused
+            self.report_media_progress(progress['done'], total, media, filename, ok)
+            return idx, ok
+
+        results = dict(await asyncio.gather(*(run(task) for task in tasks)))
+        self.apply_media_results(media_folder_name, tasks, results)
+        if store is not None:
+            await self._run_blocking(self.finish_media_store, progress['reused'])
+
+    async def convert(self, url, output_path=None, output_dir='output'):
+        """主转换流程（异步）"""
+        print(f"正在获取网页: {url}")
+        self.check_negative_cache(url)
+
+        # 检测平台
+        platform = PlatformDetector.detect(url)
+        platform_name = PlatformDetector.get_platform_name(platform)
+        print(f"检测到平台: {platform_name}")
+
+        try:
+            # 获取网页内容
+            html_content, encoding = await self.fetch_document(url)
+            if not html_content:
+                raise ConversionError("无法获取网页内容")
+
+            # 解析页面（CPU密集，放到线程中执行以免阻塞事件循环）
+            article, media_list = await self._run_blocking(
+                self.parse_article, html_content, platform, output_dir, encoding
+            )
+        except Exception as e:
+            self.remember_failure(url, e)
+            raise
+        output_path = self.resolve_output_path(article, url, output_path, output_dir)
+
+        # 下载媒体资源（如果需要）
+        if self.download_media and media_list:
+            base_name = os.path.splitext(output_path)[0]
+            await self.download_media_files(media_list, base_name)
+
+        # 构建并保存Markdown
+        final_markdown = await self._run_blocking(
+            self.build_markdown, article, media_list, platform_name, url
+        )
+        self.save_markdown(final_markdown, output_path)
+
+        return output_path
+
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+HTML转Markdown磁盘缓存
+- HTTPCache：按规范化URL缓存网页正文和校验信息（ETag / Last-Modified），再次获取时发送条件请求，
+  服务器返回 304 时直接使用缓存，不再重新传输网页。
+- MediaStore：按内容（SHA-256）存储下载的媒体文件，相同的URL不再重复下载，相同的内容只保存一份。
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+
+from html2md_net import canonicalize_url
+
+# 缓存占用上限默认值（字节）
+DEFAULT_CACHE_SIZE = 256 * 1024 * 1024
+
+
+def _write_atomic(path, data):
+    """先写临时文件再替换，多个进程同时写入时不会读到半个文件"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class HTTPCache:
+    """网页的磁盘HTTP缓存（按最近使用时间淘汰，总大小不超过 max_size）
+
+    每个条目是一个元数据文件（URL、ETag、Last-Modified、编码）和一个正文文件，
+    文件名为规范化URL的 SHA-256。命中或重新验证时更新正文文件的修改时间，淘汰时删除最久未用的条目。
+    可在多个 HTML2Markdown 实例和线程间共享。
+    """
+
+    def __init__(self, cache_dir, max_size=DEFAULT_CACHE_SIZE):
+        self.directory = Path(cache_dir) / 'pages'
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._size = None  # 当前占用字节数，首次写入时统计
+
+    def _paths(self, url):
+        key = hashlib.sha256(canonicalize_url(url).encode('utf-8')).hexdigest()
+        base = self.directory / key[:2] / key
+        return base.with_suffix('.json'), base.with_suffix('.body')
+
+    def get(self, url):
+        """读取缓存条目的校验信息，未缓存时返回None"""
+        meta_path, body_path = self._paths(url)
+        try:
+            entry = json.loads(meta_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
+        if not body_path.exists():
+            return None
+        return entry
+
+    def conditional_headers(self, entry):
+        """根据缓存条目生成条件请求头"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def load_body(self, url):
+        """读取缓存的网页原始字节（并标记为最近使用），文件已被淘汰时返回None"""
+        _, body_path = self._paths(url)
+        try:
+            body = body_path.read_bytes()
+            os.utime(body_path)
+        except OSError:
+            return None
+        return body
+
+    def put(self, url, body, encoding, etag=None, last_modified=None):
+        """写入缓存条目（没有 ETag / Last-Modified 的响应无法重新验证，不缓存）"""
+        if not etag and not last_modified:
+            return
+        if len(body) > self.max_size:
+            return
+        meta_path, body_path = self._paths(url)
+        meta = json.dumps({
+            'url': canonicalize_url(url),
+            'etag': etag,
+            'last_modified': last_modified,
+            'encoding': encoding,
+        }, ensure_ascii=False).encode('utf-8')
+
+        with self._lock:
+            previous = self._entry_size(meta_path, body_path)
+            _write_atomic(body_path, body)
+            _write_atomic(meta_path, meta)
+            if self._size is None:
+                self._size = self._scan_size()
+            else:
+                self._size += len(body) + len(meta) - previous
+            if self._size > self.max_size:
+                self._evict()
+
+    @staticmethod
+    def _entry_size(meta_path, body_path):
+        size = 0
+        for path in (meta_path, body_path):
+            try:
+                size += path.stat().st_size
+            except OSError:
+                pass
+        return size
+
+    def _scan_size(self):
+        return sum(path.stat().st_size for path in self.directory.glob('*/*') if path.is_file())
+
+    def _evict(self):
+        """按正文文件的修改时间从旧到新删除条目，直到占用降到上限的90%"""
+        entries = []
+        for body_path in self.directory.glob('*/*.body'):
+            try:
+                stat = body_path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, body_path))
+        entries.sort()
+
+        # 以磁盘上的实际占用为准（其他进程可能也在写入）
+        self._size = self._scan_size()
+        target = self.max_size * 0.9
+        for _, body_path in entries:
+            if self._size <= target:
+                break
+            meta_path = body_path.with_suffix('.json')
+            freed = self._entry_size(meta_path, body_path)
+            for path in (body_path, meta_path):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+            self._size -= freed
+
+
+_http_caches = {}
+_http_caches_lock = threading.Lock()
+
+
+def get_http_cache(cache_dir, max_size=DEFAULT_CACHE_SIZE):
+    """获取进程内共享的缓存实例（同一目录只创建一次）"""
+    key = os.path.abspath(cache_dir)
+    with _http_caches_lock:
+        cache = _http_caches.get(key)
+        if cache is None:
+            cache = _http_caches[key] = HTTPCache(cache_dir, max_size)
+        cache.max_size = max_size
+        return cache
+
+
+def _link_or_copy(source, dest):
+    """把 source 硬链接到 dest（覆盖已有文件）；不支持硬链接（跨文件系统等）时复制"""
+    dest = Path(dest)
+    temp_path = dest.with_name(f'.tmp-{os.getpid()}-{threading.get_ident()}-{dest.name}')
+    try:
+        os.link(source, temp_path)
+    except OSError:
+        shutil.copyfile(source, temp_path)
+    os.replace(temp_path, dest)
+
+
+class MediaStore:
+    """按内容寻址的媒体库（跨文章去重）
+
+    文件按 SHA-256 保存在 objects/ 下，index.json 记录 规范化URL → 文件 的映射，跨运行保留。
+    已收录的URL直接从媒体库硬链接到文章的媒体文件夹，不再访问网络；
+    新下载的文件收录后与媒体库共用同一份数据，内容相同的文件只占用一份磁盘空间。
+    媒体URL按不可变资源处理：收录后不再检查服务器上的内容是否变化。
+    """
+
+    def __init__(self, store_dir):
+        self.directory = Path(store_dir) / 'media'
+        self.index_path = self.directory / 'index.json'
+        self._lock = threading.Lock()
+        self._index = None
+        self._pending = {}  # 尚未写入 index.json 的条目
+
+    def _load_index(self):
+        try:
+            return json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+
+    @property
+    def index(self):
+        """规范化URL → 媒体库中的相对路径（首次使用时读取）"""
+        with self._lock:
+            if self._index is None:
+                self._index = self._load_index()
+            return self._index
+
+    def restore(self, url, dest):
+        """媒体库已收录该URL时链接到 dest 并返回True，否则返回False"""
+        relative = self.index.get(canonicalize_url(url))
+        if not relative:
+            return False
+        try:
+            _link_or_copy(self.directory / relative, dest)
+        except OSError:
+            return False  # 媒体库中的文件已被删除，重新下载
+        return True
+
+    def add(self, url, path):
+        """收录刚下载的文件，返回其 SHA-256
+
+        内容已在媒体库中时，path 改为指向已有的文件，不再保存第二份。
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        key = digest.hexdigest()
+        relative = f"objects/{key[:2]}/{key}{Path(path).suffix}"
+        target = self.directory / relative
+
+        if target.exists():
+            _link_or_copy(target, path)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(path, target)
+
+        url_key = canonicalize_url(url)
+        index = self.index
+        with self._lock:
+            index[url_key] = relative
+            self._pending[url_key] = relative
+        return key
+
+    def save(self):
+        """把新收录的条目写入 index.json（与其他进程写入的条目合并）"""
+        with self._lock:
+            if not self._pending:
+                return
+            index = self._load_index()
+            index.update(self._pending)
+            _write_atomic(self.index_path, json.dumps(index, ensure_ascii=False).encode('utf-8'))
+            self._index = index
+            self._pending = {}
+
+
+_media_stores = {}
+
+
+def get_media_store(store_dir):
+    """获取进程内共享的媒体库实例（同一目录只创建一次）"""
+    key = os.path.abspath(store_dir)
+    with _http_caches_lock:
+        store = _media_stores.get(key)
+        if store is None:
+            store = _media_stores[key] = MediaStore(store_dir)
+        return store
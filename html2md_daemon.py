@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+HTML转Markdown常驻后台服务
+`html2md.py serve --socket` 启动后保持模块已导入、连接池已建立；之后的命令行调用通过Unix套接字
+把转换请求交给它执行，省去每次启动解释器、导入依赖和建立TLS连接的耗时。
+
+通信协议：每行一个JSON。客户端发送一个请求，服务端逐段返回输出 {"out": 文本}，
+最后返回 {"exit": 退出码}；代码已更新（构建标识不一致）时返回 {"error": 原因}，客户端改为在本地转换。
+只连接当前用户创建的套接字，其他用户抢先创建的同名套接字会被忽略。
+"""
+
+import hashlib
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+from pathlib import Path
+
+# 客户端只需要标准库，html2md 中较重的依赖仅在后台服务中导入
+from html2md import __version__
+
+
+def default_socket_path():
+    """默认套接字路径：$HTML2MD_SOCKET，其次 $XDG_RUNTIME_DIR/html2md.sock，最后临时目录"""
+    path = os.environ.get('HTML2MD_SOCKET')
+    if path:
+        return path
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'html2md.sock')
+    uid = os.getuid() if hasattr(os, 'getuid') else 0
+    return os.path.join(tempfile.gettempdir(), f'html2md-{uid}.sock')
+
+
+def build_id():
+    """代码的构建标识：html2md 各模块的修改时间和大小的摘要，任一模块更新后随之改变"""
+    digest = hashlib.sha256(__version__.encode('utf-8'))
+    for path in sorted(Path(__file__).resolve().parent.glob('html2md*.py')):
+        info = path.stat()
+        digest.update(f'{path.name}:{info.st_mtime_ns}:{info.st_size};'.encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def _owned_by_me(socket_path):
+    """套接字文件存在、确实是套接字且属于当前用户"""
+    if not hasattr(os, 'getuid'):
+        return True  # 没有用户ID的系统（Windows）临时目录本身按用户隔离
+    try:
+        info = os.lstat(socket_path)
+    except OSError:
+        return False
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+
+def _peer_uid(sock):
+    """对端进程的用户ID（SO_PEERCRED，仅Linux），无法获取时返回None"""
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return None
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+def connect(socket_path=None):
+    """连接后台服务，未运行时返回None
+
+    套接字不属于当前用户时（其他用户可能抢先在临时目录创建同名套接字，借此获取URL、伪造输出）
+    给出警告并返回None，不把请求交给它。
+    """
+    socket_path = socket_path or default_socket_path()
+    if not hasattr(socket, 'AF_UNIX') or not os.path.exists(socket_path):
+        return None
+    if not _owned_by_me(socket_path):
+        print(f"警告: {socket_path} 不是当前用户的后台服务，已忽略")
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()  # 残留的套接字文件（服务已退出）
+        return None
+    # 检查文件和连接之间套接字可能被替换，再确认一次对端的用户
+    uid = _peer_uid(sock)
+    if uid is not None and uid != os.getuid():
+        sock.close()
+        print(f"警告: {socket_path} 不是当前用户的后台服务，已忽略")
+        return None
+    return sock
+
+
+def forward(request, socket_path=None):
+    """把转换请求交给后台服务执行
+
+    Returns:
+        退出码；后台服务未运行或无法处理该请求时返回None（由调用方在本地转换）
+    """
+    sock = connect(socket_path)
+    if sock is None:
+        return None
+
+    # 后台服务的工作目录与客户端不同，路径统一转为绝对路径
+    request = dict(request, build=build_id(), output_dir=os.path.abspath(request['output_dir']))
+    for key in ('output', 'cache_dir', 'media_store_dir'):
+        if request.get(key):
+            request[key] = os.path.abspath(request[key])
+
+    with sock, sock.makefile('rb') as replies:
+        sock.sendall(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+        for line in replies:
+            message = json.loads(line)
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'exit' in message:
+                return message['exit']
+            elif 'error' in message:
+                print(f"提示: 后台服务无法处理请求（{message['error']}），改为在本地转换")
+                return None
+
+    print("错误: 与后台服务的连接意外断开")
+    return 1
+
+
+class _ClientOutput:
+    """把一个请求的输出写回客户端连接（客户端断开后丢弃输出，转换继续完成）"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def send(self, message):
+        with self.lock:
+            if self.closed:
+                return
+            try:
+                self.wfile.write(json.dumps(message, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.wfile.flush()
+            except OSError:
+                self.closed = True
+
+    def write(self, text):
+        if text:
+            self.send({'out': text})
+        return len(text)
+
+    def flush(self):
+        pass
+
+
+def serve(socket_path=None, pool_size=None):
+    """启动后台服务（阻塞直到 Ctrl+C 或 SIGTERM）"""
+    import signal
+    import socketserver
+
+    import html2md
+    from html2md import OutputRouter, create_session, redirect_output, run_conversions
+
+    if not hasattr(socket, 'AF_UNIX'):
+        raise SystemExit("错误: 当前系统不支持Unix套接字，无法启动后台服务")
+
+    socket_path = socket_path or default_socket_path()
+    if os.path.lexists(socket_path) and not _owned_by_me(socket_path):
+        raise SystemExit(f"错误: {socket_path} 已被其他用户或其他文件占用，请用 --socket 指定其他路径")
+    if os.path.exists(socket_path):
+        existing = connect(socket_path)
+        if existing is not None:
+            existing.close()
+            raise SystemExit(f"错误: 后台服务已在运行 ({socket_path})")
+        os.unlink(socket_path)
+
+    # 启动时的构建标识：之后代码更新时客户端的标识不同，改为在本地转换
+    build = build_id()
+
+    # 预热：导入解析和渲染依赖、加载解析器插件，并建立共享连接池
+    html2md.HTML2Markdown()
+    import html2md_soup  # noqa: F401
+    html2md.platform_registry.load_plugins()
+    session = create_session(pool_maxsize=pool_size or html2md.DEFAULT_POOL_MAXSIZE)
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            output = _ClientOutput(self.wfile)
+            line = self.rfile.readline()
+            if not line:
+                return
+            request = json.loads(line)
+            if request.get('build') != build:
+                output.send({'error': "代码已更新，请重启后台服务"})
+                return
+
+            print(f"收到请求: {len(request['urls'])} 个URL")
+            with redirect_output(output):
+                try:
+                    exit_code = run_conversions(request, session=session)
+                except Exception as e:
+                    print(f"错误: {e}")
+                    exit_code = 1
+            output.send({'exit': exit_code})
+
+    class Server(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+    # 各请求的输出按上下文转发给对应的客户端
+    sys.stdout = OutputRouter(sys.stdout)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    # 创建套接字时即只允许当前用户访问（先创建再 chmod 会留下其他用户可连接的间隙）
+    old_umask = os.umask(0o077)
+    try:
+        server = Server(socket_path, RequestHandler)
+    finally:
+        os.umask(old_umask)
+    print(f"✓ 后台服务已启动: {socket_path}（Ctrl+C 退出）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        session.close()
+        sys.stdout = sys.stdout.stream
+        print("后台服务已退出")
+
+
+def serve_main(argv):
+    """html2md.py serve 的命令行入口"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='html2md.py serve',
+        description='启动常驻后台服务，之后的 html2md.py 转换会自动交给它执行'
+    )
+    parser.add_argument('--socket', nargs='?', const=None, default=None, metavar='PATH',
+                        help='Unix套接字路径（默认: $HTML2MD_SOCKET，未设置时为 $XDG_RUNTIME_DIR/html2md.sock，'
+                             '都未设置时为临时目录下的 html2md-<uid>.sock）')
+    parser.add_argument('--pool-size', type=int, default=None,
+                        help='每个主机的最大连接数（默认: 20）')
+    args = parser.parse_args(argv)
+    serve(args.socket, args.pool_size)
@@ -0,0 +1,655 @@
+#!/usr/bin/env python3
+"""
+HTML转Markdown网络访问策略
+- RateLimiter：按主机名后缀限速（令牌桶），批量转换时平稳地访问同一网站，避免触发限流和验证码。
+- HostConcurrency：按主机自适应调整并发数（AIMD），主机响应正常时逐步增加，被限流或出错时减半；
+  连续失败的主机熔断一段时间，期间直接失败。
+- NegativeCache：短期记录返回永久失败（404 / 410 / 451、文章已删除）的URL，有效期内不再请求。
+- RetryPolicy：统一的重试策略（可重试状态码分类、指数退避加随机抖动、总耗时预算），
+  网页获取、媒体下载和上传共用。
+- canonicalize_url：规范化URL，用作负缓存、结果缓存和单飞合并的键。
+- detect_encoding：按 Content-Type、BOM、<meta charset> 快速确定网页编码，都没有时才统计检测整个网页。
+只依赖标准库（统计检测编码时才导入 requests / httpx 依赖的 charset_normalizer），同步和异步引擎共用。
+"""
+
+import codecs
+import random
+import re
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# 默认限速规则：主机名后缀 → (每秒请求数, 突发请求数)
+DEFAULT_RATE_LIMITS = {
+    'mp.weixin.qq.com': (2, 5),     # 微信公众号文章页
+    'mmbiz.qpic.cn': (10, 20),      # 微信图片CDN
+    'csdn.net': (2, 4),
+}
+
+
+def parse_rate_limits(specs):
+    """解析限速规则
+
+    Args:
+        specs: 规则字符串列表，每项形如 "主机名后缀=每秒请求数[:突发数]"，也可用逗号分隔多项；
+               每秒请求数为0表示该后缀不限速
+
+    Returns:
+        {后缀: (每秒请求数, 突发数)}
+    """
+    rules = {}
+    for spec in specs:
+        for item in spec.split(','):
+            item = item.strip()
+            if not item:
+                continue
+            suffix, sep, value = item.partition('=')
+            rate, _, burst = value.partition(':')
+            try:
+                if not sep or not suffix.strip():
+                    raise ValueError
+                rules[suffix.strip().lower().lstrip('.')] = (float(rate), int(burst) if burst else None)
+            except ValueError:
+                raise ValueError(f"无效的限速规则: {item}（格式: 主机名后缀=每秒请求数[:突发数]）") from None
+    return rules
+
+
+def split_rate_limits(rules, parts):
+    """把限速规则平分给 parts 个进程
+
+    令牌桶只在进程内共享，多个进程各自按完整速率访问时，对同一网站的实际速率会乘以进程数；
+    每个进程只使用 1/parts 的速率和突发数（突发数至少为1）。
+    """
+    if parts <= 1:
+        return dict(rules)
+    return {
+        suffix: (rate / parts, max(1, burst // parts) if burst else None)
+        for suffix, (rate, burst) in rules.items()
+    }
+
+
+class TokenBucket:
+    """令牌桶：按 rate 匀速补充令牌，最多积累 burst 个
+
+    reserve() 立即预订一个令牌并返回需要等待的秒数（令牌可以透支，后来的请求依次排在后面），
+    调用方自行 sleep，同步线程和 asyncio 协程都可以使用。
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class RateLimiter:
+    """按主机名后缀限速的调度器（线程安全，可在多个转换器间共享）
+
+    主机名匹配最长的规则后缀，匹配同一后缀的主机共用一个令牌桶（例如 blog.csdn.net 和 www.csdn.net）。
+    """
+
+    def __init__(self, rules=None):
+        """
+        Args:
+            rules: {主机名后缀: (每秒请求数, 突发数)}，为None时使用 DEFAULT_RATE_LIMITS
+        """
+        if rules is None:
+            rules = DEFAULT_RATE_LIMITS
+        self._lock = threading.Lock()
+        self._buckets = {}
+        for suffix, (rate, burst) in rules.items():
+            if rate and rate > 0:
+                burst = burst or max(1, int(rate))
+                self._buckets[suffix.lower().lstrip('.')] = TokenBucket(float(rate), burst)
+
+    def match(self, host):
+        """返回主机名匹配的最长规则后缀，没有匹配时返回None"""
+        labels = (host or '').lower().split('.')
+        for i in range(len(labels)):
+            suffix = '.'.join(labels[i:])
+            if suffix in self._buckets:
+                return suffix
+        return None
+
+    def reserve(self, url):
+        """为一次请求预订令牌，返回需要等待的秒数（没有匹配规则时为0）"""
+        suffix = self.match(urlparse(url).hostname)
+        if suffix is None:
+            return 0.0
+        with self._lock:
+            return self._buckets[suffix].reserve()
+
+    def wait(self, url):
+        """同步等待，直到可以发送请求"""
+        delay = self.reserve(url)
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def limits(self):
+        """当前规则 {后缀: (每秒请求数, 突发数)}"""
+        return {suffix: (bucket.rate, bucket.burst) for suffix, bucket in self._buckets.items()}
+
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(rules=None):
+    """获取进程内共享的限速器（相同规则共用同一组令牌桶）"""
+    key = None if rules is None else tuple(sorted(
+        (suffix, tuple(limit) if isinstance(limit, (list, tuple)) else (limit, None))
+        for suffix, limit in rules.items()
+    ))
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(key)
+        if limiter is None:
+            limiter = _rate_limiters[key] = RateLimiter(None if key is None else dict(key))
+        return limiter
+
+
+# 自适应并发的默认上限（单个主机）
+DEFAULT_MAX_PER_HOST = 16
+
+# 熔断：连续失败多少次后熔断，以及熔断的冷却时间（秒）
+DEFAULT_FAILURE_THRESHOLD = 5
+DEFAULT_COOLDOWN = 30.0
+
+# 表示被限流的状态码，以及视为服务器出错的状态码
+THROTTLE_STATUS = frozenset({429, 503})
+ERROR_STATUS = frozenset({500, 502, 504})
+
+
+class HostLimit:
+    """单个主机的并发上限和统计"""
+
+    # 延迟的指数移动平均系数；平均延迟超过最低延迟的该倍数时视为主机变慢，不再增加并发
+    LATENCY_ALPHA = 0.2
+    LATENCY_TOLERANCE = 2.0
+
+    def __init__(self, limit, min_limit, max_limit):
+        self.limit = float(limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.in_flight = 0
+        self.latency = None
+        self.min_latency = None
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.last_decrease = 0.0
+        self.waiters = []  # 等待空位的协程 [(事件循环, Future), ...]
+        # 熔断状态：连续失败次数、熔断截止时间，以及冷却后是否已放行一个试探请求
+        self.failures = 0
+        self.open_until = 0.0
+        self.trial = False
+
+    @property
+    def slots(self):
+        return max(self.min_limit, int(self.limit))
+
+    def on_success(self, latency):
+        """加性增：每完成约 limit 个正常请求，并发上限加一"""
+        self.requests += 1
+        if self.latency is None:
+            self.latency = latency
+        else:
+            self.latency += self.LATENCY_ALPHA * (latency - self.latency)
+        self.min_latency = latency if self.min_latency is None else min(self.min_latency, latency)
+        if self.latency <= self.LATENCY_TOLERANCE * max(self.min_latency, 0.001):
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def on_failure(self, throttled):
+        """乘性减：被限流（429/503）或出错时并发上限减半"""
+        self.requests += 1
+        if throttled:
+            self.throttled += 1
+        else:
+            self.errors += 1
+        # 同时进行的请求往往一起失败，一个延迟周期内只减一次
+        now = time.monotonic()
+        if now - self.last_decrease < max(self.latency or 0, 1.0):
+            return
+        self.limit = max(self.min_limit, self.limit / 2)
+        self.last_decrease = now
+
+    @property
+    def circuit(self):
+        if not self.open_until:
+            return 'closed'
+        return 'open' if time.monotonic() < self.open_until else 'half_open'
+
+    def snapshot(self):
+        return {
+            'circuit': self.circuit,
+            'failures': self.failures,
+            'limit': self.slots,
+            'in_flight': self.in_flight,
+            'latency_ms': round(self.latency * 1000) if self.latency is not None else None,
+            'requests': self.requests,
+            'throttled': self.throttled,
+            'errors': self.errors,
+        }
+
+
+class CircuitOpenError(Exception):
+    """主机已熔断（连续失败次数过多），冷却期内直接失败，不重试"""
+
+
+class Slot:
+    """一次请求占用的并发名额；收到响应时调用 done(状态码) 记录状态码和首字节延迟"""
+
+    def __init__(self, trial=False):
+        self.started = time.monotonic()
+        self.status = None
+        self.latency = None
+        self.trial = trial  # 熔断冷却后的试探请求
+
+    def done(self, status):
+        self.status = status
+        self.latency = time.monotonic() - self.started
+
+
+class HostConcurrency:
+    """按主机自适应的并发控制（AIMD，线程安全，可在多个转换器间共享）
+
+    每个主机从 initial 个并发开始；请求正常且延迟没有明显上升时逐步增加（最多 max_limit），
+    返回 429/503、5xx 或连接失败时减半（最少 min_limit）。
+    连续 failure_threshold 次连接失败或 5xx 后熔断：cooldown 秒内获取名额直接抛出 CircuitOpenError，
+    冷却后放行一个试探请求，成功则恢复，失败则再次熔断。
+    同步代码使用 slot()，asyncio 协程使用 aslot()。
+    """
+
+    def __init__(self, initial=4, max_limit=DEFAULT_MAX_PER_HOST, min_limit=1,
+                 failure_threshold=DEFAULT_FAILURE_THRESHOLD, cooldown=DEFAULT_COOLDOWN):
+        self.initial = max(min_limit, initial)
+        self.max_limit = max(self.initial, max_limit)
+        self.min_limit = min_limit
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._cond = threading.Condition()
+        self._hosts = {}
+
+    def _check_circuit(self, host, state):
+        """熔断中时抛出 CircuitOpenError"""
+        if not state.open_until:
+            return
+        remaining = state.open_until - time.monotonic()
+        if remaining > 0 or state.trial:
+            raise CircuitOpenError(
+                f"{host} 连续失败 {state.failures} 次，已暂停访问（{max(remaining, 0):.0f} 秒后重试）"
+            )
+
+    def _admit(self, host, state):
+        """检查熔断状态，返回本次请求是否为冷却后的试探请求"""
+        self._check_circuit(host, state)
+        if state.open_until:
+            state.trial = True
+            return True
+        return False
+
+    def _host(self, url):
+        host = urlparse(url).hostname or ''
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostLimit(self.initial, self.min_limit, self.max_limit)
+        return host, state
+
+    def _release(self, state, slot, failed):
+        with self._cond:
+            state.in_flight -= 1
+            # 已收到响应时按状态码判断（404 等由调用方抛出的异常不算主机出错），否则是连接失败
+            connection_failed = failed and slot.status is None
+            if connection_failed or slot.status in ERROR_STATUS:
+                state.on_failure(throttled=False)
+            elif slot.status in THROTTLE_STATUS:
+                state.on_failure(throttled=True)
+            else:
+                state.on_success(slot.latency if slot.latency is not None else time.monotonic() - slot.started)
+            self._update_circuit(state, slot, connection_failed or (slot.status or 0) >= 500)
+            self._cond.notify_all()
+            waiters, state.waiters = state.waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def _update_circuit(self, state, slot, host_failed):
+        if host_failed:
+            state.failures += 1
+            if slot.trial or state.failures >= self.failure_threshold:
+                state.open_until = time.monotonic() + self.cooldown
+        elif not state.open_until or slot.trial:
+            # 熔断期间才返回的旧请求不影响熔断状态，只有试探请求成功才恢复
+            state.failures = 0
+            state.open_until = 0.0
+        if slot.trial:
+            state.trial = False
+
+    @contextmanager
+    def slot(self, url):
+        """同步获取该主机的一个并发名额（名额用尽时等待；主机熔断中时抛出 CircuitOpenError）"""
+        with self._cond:
+            host, state = self._host(url)
+            while state.in_flight >= state.slots:
+                self._check_circuit(host, state)
+                self._cond.wait()
+            trial = self._admit(host, state)
+            state.in_flight += 1
+        slot = Slot(trial)
+        failed = True
+        try:
+            yield slot
+            failed = False
+        finally:
+            self._release(state, slot, failed)
+
+    @asynccontextmanager
+    async def aslot(self, url):
+        """异步获取该主机的一个并发名额（名额用尽时等待，不阻塞事件循环）"""
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                host, state = self._host(url)
+                if state.in_flight < state.slots:
+                    trial = self._admit(host, state)
+                    state.in_flight += 1
+                    break
+                self._check_circuit(host, state)
+                waiter = loop.create_future()
+                state.waiters.append((loop, waiter))
+            await waiter
+        slot = Slot(trial)
+        failed = True
+        try:
+            yield slot
+            failed = False
+        finally:
+            self._release(state, slot, failed)
+
+    def limits(self):
+        """各主机当前的并发上限和统计 {主机: {...}}"""
+        with self._cond:
+            return {host: state.snapshot() for host, state in self._hosts.items()}
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+_concurrency_controllers = {}
+
+
+def get_host_concurrency(initial, max_limit=DEFAULT_MAX_PER_HOST):
+    """获取进程内共享的并发控制器（相同参数共用同一组主机状态）"""
+    key = (initial, max_limit)
+    with _rate_limiters_lock:
+        controller = _concurrency_controllers.get(key)
+        if controller is None:
+            controller = _concurrency_controllers[key] = HostConcurrency(initial, max_limit)
+        return controller
+
+
+# 可重试的状态码：超时、限流和网关/服务器临时故障（404、403 等不重试）
+RETRYABLE_STATUS = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# 视为临时网络故障的异常（requests / urllib3 / httpx），按类名匹配以免导入这些库
+TRANSIENT_ERRORS = frozenset({
+    'ConnectionError', 'Timeout', 'TimeoutException', 'TransportError',
+    'ChunkedEncodingError', 'ProtocolError', 'StreamReset',
+})
+
+
+def error_status(error):
+    """从异常中取出HTTP状态码，没有时返回None
+
+    支持 requests / httpx 的 response、Supabase Storage 的 StorageApiError（status 属性，可能是字符串）
+    和旧版 storage3 的 {'statusCode': ...} 参数。
+    """
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if status is None:
+        status = getattr(error, 'status', None)
+    if status is None and error.args and isinstance(error.args[0], dict):
+        status = error.args[0].get('statusCode')
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """重试策略
+
+    只重试临时故障（连接失败、超时、HTTP/2 流重置和 RETRYABLE_STATUS），等待时间为指数退避加完全随机抖动，
+    服务器给出 Retry-After 时至少等待该时长；总耗时超出 budget 后不再重试。
+    """
+
+    def __init__(self, max_attempts=3, base_delay=0.5, max_delay=8.0, budget=60.0):
+        """
+        Args:
+            max_attempts: 最多尝试次数（包括第一次）
+            base_delay: 第一次重试前的最长等待秒数，之后每次翻倍
+            max_delay: 单次等待的上限（秒）
+            budget: 从第一次尝试开始的总耗时上限（秒）
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+    def is_retryable(self, error):
+        status = error_status(error)
+        if status is not None:
+            return status in RETRYABLE_STATUS
+        if isinstance(error, (ConnectionError, TimeoutError)):
+            return True
+        names = {cls.__name__ for cls in type(error).__mro__}
+        return bool(names & TRANSIENT_ERRORS) or 'StreamReset' in str(error)
+
+    def backoff(self, attempt, error=None):
+        """第 attempt 次失败后的等待秒数"""
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        response = getattr(error, 'response', None)
+        retry_after = getattr(response, 'headers', {}).get('Retry-After', '') if response is not None else ''
+        if retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        return delay
+
+    def next_delay(self, attempt, error, started):
+        """决定是否重试：返回等待秒数，不应重试时返回None"""
+        if attempt >= self.max_attempts or not self.is_retryable(error):
+            return None
+        delay = self.backoff(attempt, error)
+        if time.monotonic() - started + delay > self.budget:
+            return None
+        return delay
+
+    def call(self, func, *args, on_retry=None):
+        """执行 func(*args)，失败时按策略重试
+
+        Args:
+            on_retry: 每次重试前调用 on_retry(第几次失败, 等待秒数, 异常)
+        """
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return func(*args)
+            except Exception as e:
+                delay = self.next_delay(attempt, e, started)
+                if delay is None:
+                    raise
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                time.sleep(delay)
+
+    async def acall(self, func, *args, on_retry=None):
+        """call 的异步版本：func(*args) 返回协程，等待时不阻塞事件循环"""
+        import asyncio
+
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await func(*args)
+            except Exception as e:
+                delay = self.next_delay(attempt, e, started)
+                if delay is None:
+                    raise
+                if on_retry:
+                    on_retry(attempt, delay, e)
+                await asyncio.sleep(delay)
+
+
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+
+# 永久失败的状态码：再次请求也不会成功，短期内不再请求
+PERMANENT_STATUS = frozenset({404, 410, 451})
+
+# 负缓存的默认有效期（秒）：永久失败的URL在这段时间内直接失败
+DEFAULT_NEGATIVE_TTL = 600
+
+
+def canonicalize_url(url):
+    """规范化URL（用作缓存键）
+
+    小写协议和主机名，去掉默认端口、片段和 utm_* 跟踪参数，并对查询参数排序。
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = parsed.hostname or ''
+    port = parsed.port
+    if port and (scheme, port) not in (('http', 80), ('https', 443)):
+        host = f"{host}:{port}"
+    query = sorted(
+        ((key, value) for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+         if not key.lower().startswith('utm_')),
+        key=lambda item: item[0]
+    )
+    return urlunparse((scheme, host, parsed.path or '/', '', urlencode(query), ''))
+
+
+class NegativeCache:
+    """短期记录永久失败的URL（按规范化URL），有效期内直接失败，不再请求和重试
+
+    进程内共享（使用模块级的 negative_cache），超出 max_size 时先清理过期条目，仍超出则清空。
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = {}  # 规范化URL -> (过期时间, 失败原因)
+        self._lock = threading.Lock()
+
+    def get(self, url):
+        """返回有效期内记录的失败原因，没有记录时返回None"""
+        key = canonicalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del self._entries[key]
+                return None
+            return entry[1]
+
+    def put(self, url, reason, ttl=DEFAULT_NEGATIVE_TTL):
+        if ttl <= 0:
+            return
+        key = canonicalize_url(url)
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+            self._entries[key] = (now + ttl, reason)
+
+
+negative_cache = NegativeCache()
+
+
+def is_permanent_failure(error):
+    """是否为永久失败（404 / 410 / 451，或解析器判定文章已被删除等）"""
+    return getattr(error, 'permanent', False) or error_status(error) in PERMANENT_STATUS
+
+
+# 在网页开头多少字节内查找 <meta charset>
+SNIFF_BYTES = 4096
+
+_BOMS = (
+    (codecs.BOM_UTF8, 'utf-8'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_HEADER_CHARSET = re.compile(r'charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+_META_CHARSET = re.compile(rb'<meta[^>]+?charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+
+# 按超集解码：声明为 GB2312 / GBK 的网页里常混有扩展字符
+_SUPERSETS = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'x-gbk': 'gb18030'}
+
+
+def _known_encoding(name):
+    """规范化声明的编码名称，Python 不支持时返回None"""
+    if isinstance(name, bytes):
+        name = name.decode('ascii', errors='ignore')
+    name = name.strip().lower()
+    try:
+        codecs.lookup(name)
+    except LookupError:
+        return None
+    return _SUPERSETS.get(name, name)
+
+
+def detect_encoding(content, content_type=None):
+    """确定网页编码
+
+    依次使用 BOM、Content-Type 中的 charset、开头 SNIFF_BYTES 字节内的 <meta charset>，
+    都没有时：纯ASCII或能按UTF-8解码则为UTF-8，否则才对整个网页做统计检测。
+
+    Args:
+        content: 网页的原始字节
+        content_type: 响应的 Content-Type 头
+
+    Returns:
+        编码名称（可直接用于 bytes.decode 和 BeautifulSoup 的 from_encoding）
+    """
+    for bom, encoding in _BOMS:
+        if content.startswith(bom):
+            return encoding
+
+    if content_type:
+        match = _HEADER_CHARSET.search(content_type)
+        encoding = match and _known_encoding(match.group(1))
+        if encoding:
+            return encoding
+
+    match = _META_CHARSET.search(content, 0, SNIFF_BYTES)
+    encoding = match and _known_encoding(match.group(1))
+    if encoding:
+        # 按UTF-16传输的网页不会走到这里（有BOM），声明的 utf-16 实际是按ASCII兼容编码读到的
+        return 'utf-8' if encoding.startswith('utf-16') else encoding
+
+    if content.isascii():
+        return 'utf-8'
+    try:
+        content.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    from charset_normalizer import from_bytes
+    best = from_bytes(content).best()
+    return best.encoding if best else 'utf-8'
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+BeautifulSoup / html2text 扩展
+依赖 bs4 和 html2text 的类放在这里，由 html2md 在首次使用时导入，命令行启动时无需加载这些库
+"""
+
+import re
+
+import html2text
+from bs4 import NavigableString, SoupStrainer, Tag
+from bs4.element import PreformattedString
+from html2text.utils import pad_tables_in_text
+
+
+class RegionStrainer(SoupStrainer):
+    """只构建指定区域子树的SoupStrainer
+
+    regions 为 [(标签名, {属性: 值}), ...]，属性匹配规则与 soup.find 相同
+    （class 可匹配其中任意一个类名或完整的类名字符串）。匹配到的标签会连同全部子孙节点保留，
+    其余标签不会被构建。
+    """
+
+    def __init__(self, regions):
+        super().__init__()
+        self.regions = regions
+
+    @staticmethod
+    def _attr_matches(attr, actual, expected):
+        if actual is None:
+            return False
+        if attr == 'class':
+            if isinstance(actual, (list, tuple)):
+                tokens, full = list(actual), ' '.join(actual)
+            else:
+                tokens, full = actual.split(), actual
+            return expected == full or expected in tokens
+        return actual == expected
+
+    def matches_region(self, name, attrs):
+        """标签是否属于需要保留的区域"""
+        for region_name, region_attrs in self.regions:
+            if name != region_name:
+                continue
+            if all(self._attr_matches(attr, attrs.get(attr), value)
+                   for attr, value in region_attrs.items()):
+                return True
+        return False
+
+    # bs4 >= 4.13
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.matches_region(name, attrs or {})
+
+    # bs4 < 4.13
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        if isinstance(markup_name, Tag):
+            name, attrs = markup_name.name, markup_name.attrs
+        else:
+            name, attrs = markup_name, markup_attrs
+        return markup_name if self.matches_region(name, dict(attrs or {})) else None
+
+
+class SoupMarkdownRenderer(html2text.HTML2Text):
+    """直接遍历BeautifulSoup树输出Markdown
+
+    html2text 需要HTML字符串，原先的做法是把已解析的子树 str() 回HTML再让它解析一遍。
+    这里按文档顺序遍历DOM，把开始标签、文本和结束标签直接交给 html2text 的输出逻辑，
+    事件顺序与解析 str(tag) 时完全相同，因此输出的Markdown保持一致。
+    """
+
+    # 这些标签内的文本序列化时不转义，html.parser 也按原样交给 handle_data
+    RAW_TEXT_TAGS = frozenset({'script', 'style'})
+    # 序列化时会被转义成实体的字符，html.parser 会把它们作为实体单独交给 handle_data
+    ENTITY_CHARS = re.compile(r'([&<>])')
+
+    def render(self, node):
+        """将Tag（含其本身）渲染为Markdown"""
+        self.start = True
+        # 显式栈代替递归，嵌套很深的页面也不会超出递归深度
+        stack = [(node, True)]
+        while stack:
+            item, opening = stack.pop()
+            if isinstance(item, Tag):
+                if not opening:
+                    self.handle_tag(item.name, {}, start=False)
+                    continue
+                attrs = {
+                    key: ' '.join(value) if isinstance(value, list) else value
+                    for key, value in item.attrs.items()
+                }
+                self.handle_tag(item.name, attrs, start=True)
+                stack.append((item, False))
+                stack.extend((child, True) for child in reversed(item.contents))
+            elif isinstance(item, NavigableString) and not isinstance(item, PreformattedString):
+                self.handle_text(item)
+
+        markdown = self.optwrap(self.finish())
+        return pad_tables_in_text(markdown) if self.pad_tables else markdown
+
+    def handle_text(self, text):
+        """处理文本节点，按 html.parser 的方式切分出实体字符"""
+        if text.parent is not None and text.parent.name in self.RAW_TEXT_TAGS:
+            self.handle_data(str(text))
+            return
+        for piece in self.ENTITY_CHARS.split(text):
+            if len(piece) == 1 and piece in '&<>':
+                self.handle_data(piece, True)
+            elif piece:
+                self.handle_data(piece)
@@ -28,6 +28,8 @@ CREATE TABLE IF NOT EXISTS conversions (
 CREATE INDEX IF NOT EXISTS idx_conversions_url ON conversions(url);
 CREATE INDEX IF NOT EXISTS idx_conversions_created_at ON conversions(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_conversions_unique_id ON conversions(unique_id);
+-- 结果缓存查询：按 URL 和选项查找最近一次转换
+CREATE INDEX IF NOT EXISTS idx_conversions_url_media ON conversions(url, download_media, created_at DESC);
 
 -- 5. 添加注释
 COMMENT ON TABLE conversions IS '记录所有 URL 转换历史';
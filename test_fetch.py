@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+网页获取测试脚本
+用本地HTTP服务器验证网页缓存、媒体库、限速、并发控制、重试和编码检测等获取行为，可直接运行或使用 pytest
+"""
+
+import asyncio
+import codecs
+import http.server
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from html2md import ContentUnavailableError, ConversionError, HTML2Markdown, create_session
+from html2md_cache import HTTPCache, MediaStore
+from html2md_net import (
+    CircuitOpenError, HostConcurrency, RateLimiter, RetryPolicy, SNIFF_BYTES, detect_encoding, parse_rate_limits
+)
+
+PAGE = '<html><head><title>缓存</title></head><body><article><h1>缓存</h1><p>正文</p></article></body></html>'
+
+
+@contextmanager
+def local_server(handle):
+    """启动本地HTTP服务器，handle(request_handler) 负责写响应；返回 (基础URL, 请求记录)"""
+    requests_seen = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests_seen.append((self.path, dict(self.headers)))
+            handle(self)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    try:
+        yield f'http://127.0.0.1:{httpd.server_address[1]}', requests_seen
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def send_page(handler, body, status=200, content_type='text/html; charset=utf-8', **headers):
+    handler.send_response(status)
+    handler.send_header('Content-Type', content_type)
+    handler.send_header('Content-Length', str(len(body)))
+    for name, value in headers.items():
+        handler.send_header(name.replace('_', '-'), value)
+    handler.end_headers()
+    handler.wfile.write(body)
+
+
+def test_cache_revalidation():
+    """再次获取时发送 If-None-Match，服务器返回 304 后使用缓存内容"""
+    etag = '"v1"'
+
+    def handle(handler):
+        if handler.headers.get('If-None-Match') == etag:
+            send_page(handler, b'', status=304, ETag=etag)
+        else:
+            send_page(handler, PAGE.encode('utf-8'), ETag=etag)
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as cache_dir:
+        converter = HTML2Markdown(session=create_session(), http_cache=HTTPCache(cache_dir))
+        first = converter.fetch_page(base + '/post')
+        second = converter.fetch_page(base + '/post?utm_source=feed')  # 规范化后是同一个URL
+
+    assert first == PAGE
+    assert second == PAGE, "304 时应返回缓存的网页内容"
+    assert len(seen) == 2
+    assert 'If-None-Match' not in seen[0][1]
+    assert seen[1][1].get('If-None-Match') == etag
+
+
+def test_cache_skips_unvalidated():
+    """没有 ETag / Last-Modified 或声明 no-store 的响应不写入缓存"""
+    def handle(handler):
+        if handler.path == '/no-store':
+            send_page(handler, PAGE.encode('utf-8'), ETag='"x"', Cache_Control='no-store')
+        else:
+            send_page(handler, PAGE.encode('utf-8'))
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as cache_dir:
+        cache = HTTPCache(cache_dir)
+        converter = HTML2Markdown(session=create_session(), http_cache=cache)
+        for path in ('/plain', '/no-store'):
+            converter.fetch_page(base + path)
+            assert cache.get(base + path) is None, path
+
+
+def test_cache_eviction():
+    """超出容量上限时淘汰最久未用的条目"""
+    with tempfile.TemporaryDirectory() as cache_dir:
+        cache = HTTPCache(cache_dir, max_size=10000)
+        body = b'x' * 3000
+        for i in range(3):
+            cache.put(f'https://example.com/{i}', body, 'utf-8', etag=f'"{i}"')
+        # 读取第一个条目，使其成为最近使用
+        assert cache.load_body('https://example.com/0') == body
+        cache.put('https://example.com/3', body, 'utf-8', etag='"3"')
+
+        assert cache.get('https://example.com/1') is None, "最久未用的条目应被淘汰"
+        assert cache.get('https://example.com/0') is not None
+        assert cache.get('https://example.com/3') is not None
+        assert cache._scan_size() <= cache.max_size
+
+
+def test_media_store_dedup():
+    """媒体库：已收录的URL跨运行不再下载，内容相同的文件只保存一份"""
+    images = {'/logo.png': b'LOGO' * 100, '/qr.png': b'QR' * 100, '/logo-copy.png': b'LOGO' * 100}
+
+    def handle(handler):
+        send_page(handler, images[handler.path])
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        store_dir = os.path.join(workdir, 'store')
+
+        def download(name, paths):
+            converter = HTML2Markdown(download_media=True, session=create_session(),
+                                      media_store=MediaStore(store_dir))  # 新实例：索引需从磁盘读取
+            media_list = [{'type': 'image', 'url': base + path} for path in paths]
+            converter.download_media_files(media_list, os.path.join(workdir, name))
+            return converter.media_map
+
+        download('first', ['/logo.png', '/qr.png'])
+        assert len(seen) == 2
+        media_map = download('second', ['/qr.png', '/logo.png', '/logo-copy.png'])
+        assert [path for path, _ in seen[2:]] == ['/logo-copy.png'], "已收录的URL不应再次下载"
+        assert media_map[base + '/logo.png'] == os.path.join('second_files', 'image_002.png')
+
+        first_logo = os.stat(os.path.join(workdir, 'first_files', 'image_001.png'))
+        second_logo = os.stat(os.path.join(workdir, 'second_files', 'image_002.png'))
+        copy = os.stat(os.path.join(workdir, 'second_files', 'image_003.png'))
+        if first_logo.st_nlink > 1:  # 文件系统支持硬链接
+            assert first_logo.st_ino == second_logo.st_ino == copy.st_ino, "相同内容应共用一份数据"
+        objects = [name for _, _, names in os.walk(os.path.join(store_dir, 'media', 'objects'))
+                   for name in names]
+        assert len(objects) == 2, objects
+
+
+def test_redownload_keeps_store_objects():
+    """重新转换到同一个媒体文件夹时，新下载的文件替换硬链接而不改写媒体库中的对象"""
+    from html2md_async import AsyncHTML2Markdown
+
+    images = {'/v1.png': b'OLD' * 100, '/v2.png': b'NEW' * 100, '/v3.png': b'NEWER' * 100}
+
+    def handle(handler):
+        send_page(handler, images[handler.path])
+
+    def store_objects(store_dir):
+        objects = os.path.join(store_dir, 'media', 'objects')
+        return {name: open(os.path.join(root, name), 'rb').read()
+                for root, _, names in os.walk(objects) for name in names}
+
+    async def download_async(converter, media_list, base_name):
+        async with converter:
+            await converter.download_media_files(media_list, base_name)
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        store_dir = os.path.join(workdir, 'store')
+        base_name = os.path.join(workdir, 'post')
+        saved = os.path.join(workdir, 'post_files', 'image_001.png')
+
+        HTML2Markdown(download_media=True, session=create_session(), media_store=MediaStore(store_dir)) \
+            .download_media_files([{'type': 'image', 'url': base + '/v1.png'}], base_name)
+        HTML2Markdown(download_media=True, session=create_session(), media_store=MediaStore(store_dir)) \
+            .download_media_files([{'type': 'image', 'url': base + '/v2.png'}], base_name)
+        with open(saved, 'rb') as f:
+            assert f.read() == images['/v2.png']
+        assert sorted(store_objects(store_dir).values()) == sorted([images['/v1.png'], images['/v2.png']]), \
+            "媒体库中已有的对象不应被改写"
+
+        asyncio.run(download_async(
+            AsyncHTML2Markdown(download_media=True, rate_limits={}, media_store=MediaStore(store_dir)),
+            [{'type': 'image', 'url': base + '/v3.png'}], base_name))
+        with open(saved, 'rb') as f:
+            assert f.read() == images['/v3.png']
+        assert sorted(store_objects(store_dir).values()) == sorted(images.values()), "异步引擎同样不应改写对象"
+        assert not [name for name in os.listdir(os.path.dirname(saved)) if '.part-' in name]
+
+
+def test_repeated_media_downloaded_once():
+    """同一篇文章中重复出现的图片只下载一次，Markdown 中都指向同一个本地文件"""
+    def handle(handler):
+        if handler.path == '/post':
+            body = ('<html><head><title>重复图片</title></head><body><article><h1>重复图片</h1>'
+                    '<img src="{0}/logo.png"><p>正文</p><img data-src="{0}/qr.png"><img src="{0}/logo.png">'
+                    '</article></body></html>').format(base)
+            send_page(handler, body.encode('utf-8'))
+        else:
+            send_page(handler, b'PNG')
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        converter = HTML2Markdown(download_media=True, session=create_session())
+        output_path = converter.convert(base + '/post', output_dir=workdir)
+        markdown = open(output_path, encoding='utf-8').read()
+
+    media_requests = [path for path, _ in seen if path != '/post']
+    assert sorted(media_requests) == ['/logo.png', '/qr.png'], media_requests
+    assert markdown.count('重复图片_files/image_001.png') == 2
+    assert markdown.count('重复图片_files/image_002.png') == 1
+
+
+def test_async_engine():
+    """异步引擎：并发下载媒体、重复图片只下载一次，输出与同步引擎一致"""
+    from html2md_async import AsyncHTML2Markdown
+
+    def handle(handler):
+        if handler.path == '/post':
+            body = ('<html><head><title>异步</title></head><body><article><h1>异步</h1>'
+                    '<img src="{0}/a.png"><p>正文</p><img src="{0}/b.png"><img src="{0}/a.png">'
+                    '</article></body></html>').format(base)
+            send_page(handler, body.encode('utf-8'))
+        else:
+            send_page(handler, handler.path.encode('utf-8'))
+
+    async def convert(output_dir):
+        async with AsyncHTML2Markdown(download_media=True, rate_limits={}) as converter:
+            return await converter.convert(base + '/post', output_dir=output_dir)
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        async_output = asyncio.run(convert(os.path.join(workdir, 'async')))
+        sync_output = HTML2Markdown(download_media=True, session=create_session(), rate_limits={}) \
+            .convert(base + '/post', output_dir=os.path.join(workdir, 'sync'))
+        markdown = open(async_output, encoding='utf-8').read()
+        assert markdown == open(sync_output, encoding='utf-8').read(), "两种引擎的输出应一致"
+        with open(os.path.join(workdir, 'async', '异步_files', 'image_002.png'), 'rb') as f:
+            assert f.read() == b'/b.png'
+
+    assert markdown.count('异步_files/image_001.png') == 2
+    assert [path for path, _ in seen].count('/a.png') == 2, "每个引擎只下载一次重复图片"
+
+
+def test_rate_limiter():
+    """按主机名后缀匹配规则，超出突发数后按速率排队"""
+    limiter = RateLimiter(parse_rate_limits(['csdn.net=2:3', 'mp.weixin.qq.com=0']))
+    assert limiter.match('blog.csdn.net') == 'csdn.net'
+    assert limiter.match('notcsdn.net') is None
+    assert limiter.match('mp.weixin.qq.com') is None, "速率为0表示不限速"
+    delays = [limiter.reserve('https://blog.csdn.net/a') for _ in range(5)]
+    assert delays[:3] == [0, 0, 0]
+    assert 0.4 < delays[3] <= 0.5 and 0.9 < delays[4] <= 1.0, delays
+
+    with local_server(lambda handler: send_page(handler, PAGE.encode('utf-8'))) as (base, seen):
+        converter = HTML2Markdown(session=create_session(), rate_limits={'127.0.0.1': (20, 2)})
+        started = time.monotonic()
+        for _ in range(6):
+            converter.fetch_page(base + '/post')
+        elapsed = time.monotonic() - started
+    assert elapsed >= 0.18, f"6 个请求（突发2，每秒20）应至少耗时 0.2 秒，实际 {elapsed:.2f} 秒"
+
+
+def test_adaptive_concurrency():
+    """正常响应时并发数逐步增加，429 时减半；404 不影响并发数；同时进行的请求数不超过上限"""
+    url = 'https://cdn.example.com/a.png'
+    controller = HostConcurrency(initial=2, max_limit=8)
+    for _ in range(20):
+        with controller.slot(url) as slot:
+            slot.done(200)
+    grown = controller.limits()['cdn.example.com']['limit']
+    assert grown > 2, grown
+
+    try:
+        with controller.slot(url) as slot:
+            slot.done(404)
+            raise RuntimeError('404')
+    except RuntimeError:
+        pass
+    assert controller.limits()['cdn.example.com']['limit'] >= grown, "404 不是主机出错"
+
+    with controller.slot(url) as slot:
+        slot.done(429)
+    stats = controller.limits()['cdn.example.com']
+    assert stats['limit'] <= max(1, grown // 2 + 1) and stats['throttled'] == 1, stats
+
+    # 同步线程和协程的并发都受当前上限约束
+    limited = HostConcurrency(initial=2, max_limit=2)
+    active = {'now': 0, 'peak': 0}
+    lock = threading.Lock()
+
+    def work():
+        with limited.slot(url) as slot:
+            with lock:
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+            time.sleep(0.02)
+            with lock:
+                active['now'] -= 1
+            slot.done(200)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert active['peak'] == 2, active
+
+    async def run_async():
+        async def one():
+            async with limited.aslot(url) as slot:
+                active['now'] += 1
+                active['peak'] = max(active['peak'], active['now'])
+                await asyncio.sleep(0.02)
+                active['now'] -= 1
+                slot.done(200)
+        await asyncio.gather(*(one() for _ in range(8)))
+
+    active['peak'] = 0
+    asyncio.run(run_async())
+    assert active['peak'] == 2, active
+
+
+def test_retry_policy():
+    """临时故障（503、断开连接）按退避重试并计数，404 不重试"""
+    failures = {'/flaky': 2, '/image.png': 1}
+
+    def handle(handler):
+        if handler.path == '/missing':
+            send_page(handler, b'not found', status=404)
+        elif failures.get(handler.path, 0) > 0:
+            failures[handler.path] -= 1
+            send_page(handler, b'busy', status=503, Retry_After='0')
+        else:
+            send_page(handler, PAGE.encode('utf-8'))
+
+    policy = RetryPolicy(max_attempts=3, base_delay=0.01)
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        converter = HTML2Markdown(session=create_session(), retry_policy=policy, rate_limits={})
+        assert converter.fetch_page(base + '/flaky') == PAGE
+        assert converter.retries == 2
+
+        try:
+            converter.fetch_page(base + '/missing')
+            raise AssertionError("404 应抛出异常")
+        except Exception as e:
+            assert '404' in str(e), e
+        assert [path for path, _ in seen].count('/missing') == 1, "404 不应重试"
+
+        assert converter.download_file(base + '/image.png', os.path.join(workdir, 'image.png'))
+        assert converter.retries == 3, "媒体下载也应按策略重试"
+
+    # 超出总耗时预算时不再重试
+    budget = RetryPolicy(max_attempts=10, base_delay=1, budget=0.1)
+    error = ConnectionError('reset')
+    assert budget.next_delay(1, error, time.monotonic() - 0.5) is None
+    assert policy.next_delay(1, error, time.monotonic()) is not None
+    assert policy.next_delay(3, error, time.monotonic()) is None, "超过最多尝试次数"
+
+    # Supabase 上传失败：storage3 的 StorageApiError 把状态码放在 status 属性中（可能是字符串）
+    try:
+        from storage3.exceptions import StorageApiError
+    except ImportError:
+        return  # 未安装 API 依赖时跳过
+    for status in (429, 500, 503, '502'):
+        assert policy.is_retryable(StorageApiError('upload failed', 'error', status)), status
+    assert not policy.is_retryable(StorageApiError('not found', 'not_found', 404))
+
+
+def test_circuit_breaker_and_negative_cache():
+    """主机连续失败后熔断、冷却后试探恢复；404 和已删除的文章在有效期内直接失败"""
+    controller = HostConcurrency(failure_threshold=2, cooldown=0.2)
+    url = 'http://broken.test/a'
+    for _ in range(2):
+        try:
+            with controller.slot(url):
+                raise ConnectionError('reset')
+        except ConnectionError:
+            pass
+    try:
+        with controller.slot(url):
+            pass
+        raise AssertionError("连续失败后应熔断")
+    except CircuitOpenError:
+        pass
+    assert controller.limits()['broken.test']['circuit'] == 'open'
+
+    time.sleep(0.25)
+    with controller.slot(url) as slot:  # 冷却结束后的试探请求
+        slot.done(200)
+    assert controller.limits()['broken.test']['circuit'] == 'closed'
+
+    with local_server(lambda handler: send_page(handler, b'not found', status=404)) as (base, seen), \
+            tempfile.TemporaryDirectory() as workdir:
+        converter = HTML2Markdown(session=create_session(), rate_limits={})
+        for _ in range(2):
+            try:
+                converter.convert(base + '/gone', output_dir=workdir)
+                raise AssertionError("404 应转换失败")
+            except ConversionError:
+                pass
+            except Exception as e:
+                assert '404' in str(e), e
+        assert len(seen) == 1, "近期失败的URL不应再次请求"
+
+        deleted = '<html><body><div class="weui-msg">该内容已被发布者删除</div></body></html>'
+        try:
+            converter.parse_article(deleted, 'wechat', workdir)
+            raise AssertionError("已删除的文章应抛出 ContentUnavailableError")
+        except ContentUnavailableError:
+            pass
+        assert not os.path.exists(os.path.join(workdir, 'debug.html')), "已删除的文章不应保存 debug.html"
+
+
+def test_detect_encoding():
+    """按 BOM、Content-Type、<meta charset> 确定编码，字节直接交给解析器"""
+    assert detect_encoding(codecs.BOM_UTF8 + b'<html>', 'text/html; charset=gbk') == 'utf-8'
+    assert detect_encoding(b'<html>', 'text/html; charset="GBK"') == 'gb18030'
+    meta = b'<meta http-equiv="Content-Type" content="text/html; charset=gb2312">'
+    assert detect_encoding(meta, 'text/html') == 'gb18030'
+    assert detect_encoding(b' ' * SNIFF_BYTES + b'<meta charset="gbk">') == 'utf-8', "只在开头查找 <meta>"
+    assert detect_encoding('<p>中文</p>'.encode('utf-8'), 'text/html') == 'utf-8'
+
+    page = '<html><head><meta charset="gbk"><title>编码</title></head><body><article><h1>编码</h1>' \
+           '<p>简体中文正文，含扩展字符：镕</p></article></body></html>'
+    # 响应头不带 charset，由 <meta> 决定编码
+    def handle(handler):
+        send_page(handler, page.encode('gb18030'), content_type='text/html')
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        converter = HTML2Markdown(session=create_session(), download_media=False, rate_limits={})
+        content, encoding = converter.fetch_document(base + '/gbk')
+        assert isinstance(content, bytes) and encoding == 'gb18030'
+        assert converter.fetch_page(base + '/gbk') == page
+        output = converter.convert(base + '/gbk', output_dir=workdir)
+        with open(output, encoding='utf-8') as f:
+            assert '简体中文正文，含扩展字符：镕' in f.read()
+
+
+def test_cli_batch():
+    """命令行批量转换：汇总URL、并发转换、输出汇总表；单个URL获取失败时返回 1 而不是抛出异常"""
+    import argparse
+    import io
+    from contextlib import redirect_stdout
+
+    from html2md import read_urls, run_conversions
+
+    def handle(handler):
+        if handler.path in ('/missing', '/gone'):
+            send_page(handler, b'not found', status=404)
+        else:
+            title = handler.path.strip('/')
+            send_page(handler, PAGE.replace('缓存', title).encode('utf-8'))
+
+    with local_server(handle) as (base, seen), tempfile.TemporaryDirectory() as workdir:
+        url_file = os.path.join(workdir, 'urls.txt')
+        with open(url_file, 'w', encoding='utf-8') as f:
+            f.write(f"# 注释\n{base}/first\n\n{base}/second\n{base}/first\n")
+        urls = read_urls(argparse.Namespace(urls=[base + '/missing'], input=[url_file]))
+        assert urls == [base + '/missing', base + '/first', base + '/second'], urls
+
+        request = {
+            'urls': urls, 'output': None, 'output_dir': os.path.join(workdir, 'out'), 'jobs': 3,
+            'pool_size': 4, 'download_media': False, 'keep_alive': True, 'media_workers': 2,
+            'per_host_limit': 2, 'max_per_host': 4, 'parser_backend': None, 'cache_dir': None,
+            'cache_size': 1, 'media_store_dir': None, 'rate_limits': {},
+        }
+        output = io.StringIO()
+        with redirect_stdout(output):
+            assert run_conversions(request) == 1, "有失败的URL时退出码为 1"
+        summary = output.getvalue()
+        assert '成功 2/3，失败 1' in summary, summary
+        assert os.path.exists(os.path.join(workdir, 'out', 'first.md'))
+        assert os.path.exists(os.path.join(workdir, 'out', 'second.md'))
+
+        # 单个URL：HTTP 错误和连接失败都只输出错误信息并返回 1
+        for url in (base + '/gone', 'http://127.0.0.1:9/unreachable'):
+            with redirect_stdout(io.StringIO()):
+                assert run_conversions(dict(request, urls=[url], jobs=1)) == 1, url
+
+
+def main():
+    """主函数"""
+    tests = [
+        ("缓存重新验证（304）", test_cache_revalidation),
+        ("不缓存无法验证的响应", test_cache_skips_unvalidated),
+        ("缓存容量淘汰", test_cache_eviction),
+        ("媒体库去重", test_media_store_dedup),
+        ("重新下载不改写媒体库对象", test_redownload_keeps_store_objects),
+        ("文章内重复图片只下载一次", test_repeated_media_downloaded_once),
+        ("异步转换引擎", test_async_engine),
+        ("按主机限速", test_rate_limiter),
+        ("自适应并发（AIMD）", test_adaptive_concurrency),
+        ("重试策略", test_retry_policy),
+        ("熔断与失败缓存", test_circuit_breaker_and_negative_cache),
+        ("网页编码检测", test_detect_encoding),
+        ("命令行批量转换", test_cli_batch),
+    ]
+
+    print("=" * 60)
+    print("  HTML2MD 网页获取测试")
+    print("=" * 60)
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✓ {name}")
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ {name}: {e}")
+        except Exception as e:
+            print(f"✗ {name}: {type(e).__name__}: {e}")
+
+    print("=" * 60)
+    print(f"通过: {passed}/{len(tests)}")
+    sys.exit(0 if passed == len(tests) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+解析器测试脚本
+离线测试各平台解析器（无需网络），可直接运行或使用 pytest
+"""
+
+import sys
+
+import html2text
+from bs4 import BeautifulSoup
+
+from html2md import (
+    HTML2Markdown, GenericParser, PlatformDetector, PlatformRegistry, PARSER_BACKENDS, configure_markdown
+)
+
+
+# 各平台的示例页面（保留真实页面的主要结构：正文容器、元信息、侧栏和脚本）
+FIXTURES = {
+    'wechat': ('https://mp.weixin.qq.com/s/abcdef', """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>微信文章</title>
+<script>var biz = "MzA5";</script><style>.rich_media{color:red}</style></head>
+<body>
+<div id="js_article" class="rich_media">
+  <h1 class="rich_media_title" id="activity-name">
+      深入理解 Python 异步编程
+  </h1>
+  <div id="meta_content">
+    <span class="rich_media_meta rich_media_meta_text">张三</span>
+    <a class="rich_media_meta rich_media_meta_link rich_media_meta_nickname" href="javascript:void(0);">技术周刊</a>
+    <em id="publish_time" class="rich_media_meta rich_media_meta_text">2024-01-15 10:30</em>
+  </div>
+  <div class="rich_media_content" id="js_content" style="visibility: hidden;">
+    <section><p>asyncio 是 Python 的<strong>异步</strong>框架&nbsp;&amp;&nbsp;事件循环。</p>
+    <script>console.log("inline");</script>
+    <p><img data-src="https://mmbiz.qpic.cn/mmbiz_png/abc/640?wx_fmt=png" data-ratio="0.5"></p>
+    <h2>1. 事件循环</h2>
+    <pre><code>import asyncio
+async def main():
+    await asyncio.sleep(1)</code></pre>
+    <ul><li>协程</li><li>任务 <em>Task</em></li></ul>
+    <p>参考：<a href="https://docs.python.org/3/library/asyncio.html">官方文档</a></p>
+    <iframe class="video_iframe" data-src="https://v.qq.com/txp/iframe/player.html?vid=x123"></iframe>
+    <p><img data-src="https://mmbiz.qpic.cn/mmbiz_jpg/def/640?wx_fmt=jpeg"></p>
+    <style>p{margin:0}</style>
+    </section>
+  </div>
+</div>
+<div class="qr_code_pc"><img src="https://res.wx.qq.com/qrcode.png"></div>
+</body></html>"""),
+
+    'zhihu': ('https://zhuanlan.zhihu.com/p/123456', """<!DOCTYPE html>
+<html lang="zh"><head><meta charset="utf-8"><meta name="author" content="李四">
+<title>知乎专栏</title></head>
+<body><div class="App"><header class="AppHeader">导航</header>
+<main><article class="Post-Main">
+  <h1 class="Post-Title">如何评价 Rust 的所有权机制？</h1>
+  <div class="Post-RichTextContainer"><div class="RichText">
+    <p>所有权规则有三条：</p>
+    <ol><li>每个值都有一个所有者</li><li>同一时间只有一个所有者</li><li>所有者离开作用域，值被丢弃</li></ol>
+    <blockquote>借用检查器是编译期的。</blockquote>
+    <figure><img src="https://pic1.zhimg.com/v2-abc_720w.jpg" data-original="https://pic1.zhimg.com/v2-abc_r.jpg"><figcaption>图1</figcaption></figure>
+    <p>代码 <code>let s = String::from("hi");</code> 展示了移动语义。</p>
+  </div></div>
+</article></main>
+<aside class="Post-Sidebar"><div class="Card">推荐阅读</div></aside></div>
+</body></html>"""),
+
+    'juejin': ('https://juejin.cn/post/7300000000000000000', """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>掘金</title></head>
+<body><div id="juejin"><div class="main-area article-area">
+  <h1 class="article-title">Vue3 响应式原理解析</h1>
+  <div class="author-info-block"><span class="username">王五</span></div>
+  <article class="article-content"><div class="markdown-body">
+    <h2>Proxy</h2>
+    <p>Vue3 使用 <code>Proxy</code> 替代 <code>Object.defineProperty</code>。</p>
+    <table><thead><tr><th>特性</th><th>Vue2</th><th>Vue3</th></tr></thead>
+    <tbody><tr><td>数组监听</td><td>部分</td><td>完整</td></tr></tbody></table>
+    <p><img src="https://p3-juejin.byteimg.com/tos-cn-i-k3u1fbpfcp/abc~tplv.image" alt="响应式"></p>
+    <pre><code class="hljs language-js">const state = reactive({ count: 0 })</code></pre>
+  </div></article>
+</div>
+<div class="sidebar"><div class="recommended-links">相关文章</div></div></div>
+</body></html>"""),
+
+    'csdn': ('https://blog.csdn.net/user/article/details/1234567', """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>CSDN博客</title>
+<script src="https://g.csdnimg.cn/common/csdn-report/report.js"></script></head>
+<body class="nodata">
+<div id="csdn-toolbar">工具栏</div>
+<div class="main_father"><aside class="blog_container_aside"><div id="asideProfile">博主信息</div>
+  <div id="asideHotArticle"><ul><li><a href="/a">热门文章1</a></li><li><a href="/b">热门文章2</a></li></ul></div></aside>
+<main><div class="blog-content-box">
+  <div class="article-header-box"><h1 class="title-article" id="articleContentId">Linux 常用命令总结</h1>
+    <div class="bar-content"><a class="follow-nickName" href="https://blog.csdn.net/user">赵六</a></div></div>
+  <article class="baidu_pl"><div id="article_content" class="article_content clearfix">
+    <div id="content_views" class="markdown_views prism-atom-one-dark">
+      <h3><a name="t0"></a>文件操作</h3>
+      <pre><code class="prism language-bash">ls -la
+cp -r src/ dst/</code></pre>
+      <p>查看磁盘：<code>df -h</code><br>查看内存：<code>free -m</code></p>
+      <p><img src="https://img-blog.csdnimg.cn/20240115abc.png" alt="在这里插入图片描述"></p>
+    </div>
+  </div></article>
+</div>
+<div class="recommend-box"><div class="recommend-item-box">推荐 1</div><div class="recommend-item-box">推荐 2</div></div>
+</main></div>
+</body></html>"""),
+
+    'generic': ('https://example.com/blog/hello-world', """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Hello World - Example Blog</title>
+<meta property="og:title" content="Hello World"></head>
+<body><nav><a href="/">首页</a> <a href="/about">关于</a></nav>
+<div class="layout"><div class="wrapper">
+  <article><h1>Hello World</h1>
+    <p>这是一篇<b>示例</b>文章，包含<a href="https://example.com/link">链接</a>。</p>
+    <video src="https://example.com/media/intro.mp4" controls></video>
+    <p><img src="https://example.com/images/cover.webp" alt="封面"></p>
+  </article>
+</div></div>
+<footer>© 2024</footer></body></html>"""),
+}
+
+
+# Markdown渲染的边界情况（实体、嵌套列表、引用、表格、链接、强调、代码块等）
+MARKDOWN_CORPUS = [
+    '<div><p>a &amp; b &lt;tag&gt; 5 > 3 * not_emph_ # x</p><p>1. 不是列表\n+ plus - minus</p></div>',
+    '<div><ul><li>one<ul><li>nested <b>bold</b></li></ul></li>'
+    '<li>two<ol start="3"><li>x</li><li>y<pre>code\n  line</pre></li></ol></li></ul></div>',
+    '<div><blockquote>引用<br>第二行<blockquote>内层</blockquote></blockquote><hr><p>after</p></div>',
+    '<div><a href="#sec">内部链接</a> <a href="https://a.com" title="T">ext</a> '
+    '<a href="https://b.com">https://b.com</a> <a href="https://c.com"></a> '
+    '<a href="https://d.com"><img src="x.png" alt="x"></a><a><h2>head in a</h2></a></div>',
+    '<div>text<em>emph</em>more <strong>s</strong>**x<del>d</del>~<s>s</s> <code>a*b_c</code>'
+    '<kbd>k</kbd><q>q</q><abbr title="t">ab</abbr><sup>1</sup></div>',
+    '<div><table><tr><th>h1</th><th>h2</th></tr><tr><td>a|b</td><td><p>p in td</p></td></tr></table></div>',
+    '<div><dl><dt>term</dt><dd>def</dd></dl><!-- comment --><script>var a = "<b>&amp;</b>";</script>'
+    '<style>p{}</style>\xa0nbsp\xa0 end</div>',
+    '<div><p>中文，<em>强调</em>文字。<b>加粗</b>后面</p><h3>标题 <a href="/x">链接</a></h3>'
+    '<pre><code class="x">if a &lt; b &amp;&amp; c:\n    pass</code></pre></div>',
+    '<section><p>  lots   of\n\n whitespace  </p><span> </span><i></i><b> </b><p>x</p></section>',
+]
+
+
+def extract(platform, html, parser_backend, partial=False):
+    """使用指定解析器后端解析页面，返回可比较的结果
+
+    partial 为 True 时只构建解析器声明的区域（parse_only）
+    """
+    converter = HTML2Markdown(parser_backend=parser_backend)
+    parser = converter.get_parser(platform)
+    strainer = parser.parse_only() if partial else None
+    soup = BeautifulSoup(html, parser_backend, parse_only=strainer)
+    article = parser.parse(soup)
+    media_list = parser.extract_media(article['content'])
+    return {
+        'title': article['title'],
+        'author': article['author'],
+        'publish_time': article.get('publish_time'),
+        'media': [(m['type'], m['url']) for m in media_list],
+        'markdown': converter.clean_markdown(
+            converter.html_to_markdown(article['content'], media_list)
+        ),
+    }
+
+
+def test_fixture_platforms():
+    """示例页面应被识别为对应平台"""
+    for platform, (url, _) in FIXTURES.items():
+        assert PlatformDetector.detect(url) == platform, url
+
+
+def test_platform_detection():
+    """按主机名后缀识别平台，路径和查询参数中的域名不影响结果"""
+    cases = {
+        'https://www.zhihu.com/question/1/answer/2': 'zhihu',
+        'https://ZhuanLan.Zhihu.com:443/p/1': 'zhihu',
+        'https://example.com/redirect?to=https://zhuanlan.zhihu.com/p/1': 'generic',
+        'https://example.com/blog.csdn.net/post': 'generic',
+        'https://notzhihu.com/p/1': 'generic',
+        'https://weixin.qq.com/s/abc': 'generic',
+        'http://xhslink.com/abc': 'xiaohongshu',
+        'not a url': 'generic',
+    }
+    for url, platform in cases.items():
+        assert PlatformDetector.detect(url) == platform, url
+
+
+def test_platform_registry():
+    """新平台注册主机名后缀和解析器路径即可，解析器在首次使用时才导入"""
+    registry = PlatformRegistry()
+    registry.register('generic', [], GenericParser, '通用网页')
+    registry.register('example', ['example.org'], 'html2md:CSDNParser', '示例')
+    registry.register('example_docs', ['docs.example.org'], None, '示例文档')
+    registry._plugins_loaded = True  # 不加载已安装的第三方插件
+
+    assert registry.detect('https://blog.example.org/a') == 'example'
+    assert registry.detect('https://docs.example.org/a') == 'example_docs'
+    assert registry.get_name('example') == '示例'
+    assert registry.get_parser_class('example').__name__ == 'CSDNParser'
+    assert registry.get_parser_class('example_docs') is GenericParser
+
+
+def test_parser_backend_parity():
+    """各平台解析器在 lxml 和 html.parser 下提取的内容完全一致"""
+    for platform, (_, html) in FIXTURES.items():
+        results = {backend: extract(platform, html, backend) for backend in PARSER_BACKENDS}
+        baseline = results['html.parser']
+        assert baseline['markdown'], f"{platform}: 未提取到正文"
+        for backend, result in results.items():
+            for field, value in baseline.items():
+                assert result[field] == value, f"{platform}: {backend} 的 {field} 与 html.parser 不一致"
+
+
+def test_partial_parse_parity():
+    """只解析所需区域时，提取的内容与解析整个页面完全一致"""
+    for platform, (_, html) in FIXTURES.items():
+        for backend in PARSER_BACKENDS:
+            full = extract(platform, html, backend)
+            partial = extract(platform, html, backend, partial=True)
+            assert partial == full, f"{platform}: {backend} 部分解析结果与完整解析不一致"
+
+
+def test_partial_parse_skips_other_regions():
+    """部分解析不构建侧栏、推荐列表等区域"""
+    _, html = FIXTURES['csdn']
+    parser = HTML2Markdown().get_parser('csdn')
+    for backend in PARSER_BACKENDS:
+        soup = BeautifulSoup(html, backend, parse_only=parser.parse_only())
+        assert soup.find(id='asideHotArticle') is None
+        assert soup.find(class_='recommend-box') is None
+        assert soup.find('article', class_='baidu_pl') is not None
+
+
+def test_content_preprocessing():
+    """extract_media 的单次遍历完成移除脚本、补全src和收集媒体"""
+    url, html = FIXTURES['wechat']
+    for backend in PARSER_BACKENDS:
+        parser = HTML2Markdown(parser_backend=backend).get_parser('wechat')
+        content = parser.parse(BeautifulSoup(html, backend))['content']
+        media_list = parser.extract_media(content)
+        assert content.find(['script', 'style']) is None
+        assert [m['type'] for m in media_list] == ['image', 'image', 'video']
+        assert all(tag['src'] == m['url'] for m in media_list for tag in m['tags'])
+
+
+def test_markdown_renderer_golden():
+    """直接遍历DOM的渲染器与 html2text 解析序列化HTML的输出完全一致"""
+    for backend in PARSER_BACKENDS:
+        # 语料都是单个根元素（lxml 会补上 html/body，html.parser 不会）
+        nodes = [BeautifulSoup(html, backend).find(['div', 'section']) for html in MARKDOWN_CORPUS]
+        for platform, (_, html) in FIXTURES.items():
+            converter = HTML2Markdown(parser_backend=backend)
+            nodes.append(converter.get_parser(platform).parse(BeautifulSoup(html, backend))['content'])
+        for node in nodes:
+            # 懒加载属性补全到src在 extract_media 的预处理遍历中完成，html_to_markdown 不改动未下载媒体的树，
+            # 所以两者渲染的是同一棵树
+            rendered = HTML2Markdown().html_to_markdown(node, [])
+            expected = configure_markdown(html2text.HTML2Text()).handle(str(node))
+            assert rendered == expected, f"{backend}: 渲染结果与 html2text 不一致\n{node}"
+
+
+def test_generic_content_scoring():
+    """通用解析器找不到 article/main 时，选出段落最多、链接密度低的正文div"""
+    paragraph = '<p>这是一段正文内容，包含逗号，用于计算得分，长度超过二十五个字符的阈值。</p>'
+    nav = '<div id="nav">' + '<a href="/x">很长的导航链接文字，很长的导航链接文字</a>' * 50 + '</div>'
+    body = '<div class="wrapper">' * 50 + '<div id="post">' + paragraph * 10 + '</div>' + '</div>' * 50
+    html = f'<html><head><title>无语义标签</title></head><body>{nav}{body}</body></html>'
+    for backend in PARSER_BACKENDS:
+        article = GenericParser().parse(BeautifulSoup(html, backend))
+        assert article['content'].get('id') == 'post', f"{backend}: 选中了错误的区域"
+
+
+def main():
+    """主函数"""
+    tests = [
+        ("平台识别", test_fixture_platforms),
+        ("按主机名识别平台", test_platform_detection),
+        ("平台注册表", test_platform_registry),
+        ("解析器后端一致性", test_parser_backend_parity),
+        ("部分解析一致性", test_partial_parse_parity),
+        ("部分解析跳过无关区域", test_partial_parse_skips_other_regions),
+        ("通用解析器正文打分", test_generic_content_scoring),
+        ("正文预处理单次遍历", test_content_preprocessing),
+        ("Markdown渲染与html2text一致", test_markdown_renderer_golden),
+    ]
+
+    print("=" * 60)
+    print("  HTML2MD 解析器测试")
+    print("=" * 60)
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✓ {name}")
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ {name}: {e}")
+        except Exception as e:
+            print(f"✗ {name}: {type(e).__name__}: {e}")
+
+    print("=" * 60)
+    print(f"通过: {passed}/{len(tests)}")
+    sys.exit(0 if passed == len(tests) else 1)
+
+
+if __name__ == "__main__":
+    main()
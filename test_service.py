@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+API 服务离线测试脚本
+用 httpx.ASGITransport 直接调用 FastAPI 应用，并替换实际的转换函数，验证请求合并、缓存、限流、
+异步任务和批量转换等服务端逻辑（无需网络和 Supabase），可直接运行或使用 pytest
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+
+# 不连接 Supabase：结果缓存只使用内存层
+os.environ['SUPABASE_URL'] = ''
+os.environ['SUPABASE_KEY'] = ''
+
+import httpx
+
+import api_service
+from api_service import SingleFlight
+
+
+@asynccontextmanager
+async def api_client(convert):
+    """替换 process_conversion_async 为 convert(url, download_media, on_stage)，返回连接到应用的客户端"""
+    original = api_service.process_conversion_async
+    api_service.process_conversion_async = convert
+    api_service.result_cache.entries.clear()
+    try:
+        transport = httpx.ASGITransport(app=api_service.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://api.test') as client:
+            yield client
+    finally:
+        api_service.process_conversion_async = original
+        api_service.result_cache.entries.clear()
+
+
+def child_rate_limits(url, output_path, output_dir, **options):
+    """在进程池子进程中代替 convert_url：返回子进程中转换器实际使用的限速规则"""
+    from html2md import HTML2Markdown
+    return HTML2Markdown(**options).rate_limiter.limits
+
+
+def fake_result(url):
+    return {"md_url": f"https://storage.test/{url.rsplit('/', 1)[-1]}.md", "md_filename": "a.md",
+            "media_files": 0, "unique_id": "id"}
+
+
+def test_busy_returns_503():
+    """同时进行的转换数达到上限时返回 503 和 Retry-After，/health 不受正在进行的转换影响"""
+    release = asyncio.Event()
+
+    async def convert(url, download_media, on_stage=None):
+        await release.wait()
+        return fake_result(url)
+
+    async def run():
+        executor = api_service.conversion_executor
+        max_in_flight, executor.max_in_flight = executor.max_in_flight, 1
+        try:
+            async with api_client(convert) as client:
+                first = asyncio.create_task(client.get('/api/convert', params={'url': 'https://example.com/1'}))
+                while executor.in_flight == 0:
+                    await asyncio.sleep(0.01)
+                busy = await client.get('/api/convert', params={'url': 'https://example.com/2'})
+                health = await client.get('/health')
+                release.set()
+                return busy, health, await first
+        finally:
+            executor.max_in_flight = max_in_flight
+
+    busy, health, first = asyncio.run(run())
+    assert busy.status_code == 503
+    assert busy.headers['Retry-After'] == str(api_service.RETRY_AFTER_SECONDS)
+    assert health.json()['executor']['in_flight'] == 1
+    assert first.status_code == 200 and first.json()['success']
+    assert api_service.conversion_executor.in_flight == 0, "转换结束后应释放名额"
+
+
+def test_offloaded_rate_limits():
+    """同步引擎把转换放到进程池时，各子进程的限速器只使用 1/CPU_WORKERS 的限额"""
+    async def run():
+        executor = api_service.ConversionExecutor(max_in_flight=2, io_workers=2, cpu_workers=2)
+        saved = (api_service.conversion_executor, api_service.convert_url_to_dir,
+                 api_service.upload_conversion, api_service.RATE_LIMITS)
+        api_service.conversion_executor = executor
+        api_service.convert_url_to_dir = child_rate_limits
+        api_service.upload_conversion = lambda url, download_media, output_dir, limits, on_stage: limits
+        api_service.RATE_LIMITS = {'csdn.net': (2.0, 4), 'mmbiz.qpic.cn': (10.0, 20)}
+        try:
+            return await api_service.process_conversion_offloaded('https://blog.csdn.net/a', False)
+        finally:
+            (api_service.conversion_executor, api_service.convert_url_to_dir,
+             api_service.upload_conversion, api_service.RATE_LIMITS) = saved
+            executor.cpu_pool.shutdown()
+            executor.io_pool.shutdown()
+
+    limits = asyncio.run(run())
+    assert limits == {'csdn.net': (1.0, 2), 'mmbiz.qpic.cn': (5.0, 10)}, limits
+
+
+def test_jobs_and_callback():
+    """异步任务：立即返回任务ID，轮询可见阶段和结果；完成后投递回调，失败时重试"""
+    callbacks = []
+
+    def receive(request):
+        callbacks.append(json.loads(request.content))
+        return httpx.Response(500 if len(callbacks) == 1 else 200)
+
+    async def convert(url, download_media, on_stage=None):
+        on_stage("converting")
+        await asyncio.sleep(0.05)
+        if url.endswith('/broken'):
+            raise ValueError('解析失败')
+        on_stage("uploading")
+        return fake_result(url)
+
+    async def wait_done(client, status_url):
+        while True:
+            job = (await client.get(status_url)).json()['data']
+            if job['status'] in ('succeeded', 'failed'):
+                return job
+            await asyncio.sleep(0.02)
+
+    async def run():
+        original = api_service.async_http_client
+        api_service.async_http_client = httpx.AsyncClient(transport=httpx.MockTransport(receive))
+        try:
+            async with api_client(convert) as client:
+                created = await client.post('/api/jobs', json={
+                    'url': 'https://example.com/post', 'callback_url': 'https://hooks.test/done'})
+                broken = await client.post('/api/jobs', json={'url': 'https://example.com/broken'})
+                missing = await client.get('/api/jobs/unknown')
+                done = await wait_done(client, created.json()['data']['status_url'])
+                failed = await wait_done(client, broken.json()['data']['status_url'])
+                return created, missing, done, failed
+        finally:
+            await api_service.async_http_client.aclose()
+            api_service.async_http_client = original
+
+    created, missing, done, failed = asyncio.run(run())
+    assert created.status_code == 202 and created.json()['data']['status'] == 'queued'
+    assert missing.status_code == 404
+    assert done['stage'] == 'done' and done['result']['md_url'].endswith('/post.md')
+    assert done['callback'] == {'delivered': True, 'attempts': 2, 'error': None}, done['callback']
+    assert [payload['status'] for payload in callbacks] == ['succeeded', 'succeeded']
+    assert callbacks[-1]['job_id'] == done['job_id']
+    assert failed['error'] == '转换失败: 解析失败' and failed['callback'] is None
+
+
+def test_job_retention():
+    """只淘汰已结束的任务；任务在执行期间被移出 JobStore 时，回调仍使用本次执行的结果"""
+    store = api_service.JobStore(retention=2)
+    first, second, third = (store.create(f'https://example.com/{i}', False, None) for i in range(3))
+    assert len(store.jobs) == 3, "排队中的任务不应被淘汰"
+    store.update(first['job_id'], status='succeeded')
+    store.create('https://example.com/3', False, None)
+    assert first['job_id'] not in store.jobs and second['job_id'] in store.jobs
+
+    callbacks = []
+
+    def receive(request):
+        callbacks.append(json.loads(request.content))
+        return httpx.Response(200)
+
+    async def convert(url, download_media, on_stage=None):
+        api_service.jobs.jobs.clear()  # 模拟任务在执行期间被淘汰
+        return fake_result(url)
+
+    async def run():
+        original = api_service.async_http_client
+        api_service.async_http_client = httpx.AsyncClient(transport=httpx.MockTransport(receive))
+        try:
+            async with api_client(convert):
+                job = api_service.jobs.create('https://example.com/evicted', False, 'https://hooks.test/done')
+                await api_service.run_job(job['job_id'])
+        finally:
+            await api_service.async_http_client.aclose()
+            api_service.async_http_client = original
+
+    asyncio.run(run())
+    assert len(callbacks) == 1
+    assert callbacks[0]['status'] == 'succeeded' and callbacks[0]['stage'] == 'done', callbacks[0]
+    assert callbacks[0]['result']['md_url'].endswith('/evicted.md')
+
+
+def test_result_cache():
+    """按规范化 URL 和选项缓存结果：跟踪参数不同也命中，refresh 和不同选项重新转换，过期条目失效"""
+    calls = []
+
+    async def convert(url, download_media, on_stage=None):
+        calls.append((url, download_media))
+        return fake_result(url)
+
+    async def run():
+        async with api_client(convert) as client:
+            urls = ['https://example.com/p?b=1&utm_source=feed', 'https://Example.com/p?b=1#top']
+            results = [(await client.get('/api/convert', params={'url': url})).json()['data'] for url in urls]
+            await client.get('/api/convert', params={'url': urls[1], 'refresh': 'true'})
+            await client.get('/api/convert', params={'url': urls[1], 'download_media': 'false'})
+            return results
+
+    first, second = asyncio.run(run())
+    assert not first['cached'] and second['cached'], (first, second)
+    assert second['md_url'] == first['md_url']
+    assert [download for _, download in calls] == [True, True, False], calls
+
+    cache = api_service.ResultCache(ttl=60, max_size=2)
+    key = cache.make_key('https://example.com/old', True)
+    cache.put(key, {'md_url': 'old'}, created_at=time.time() - 120)
+    assert cache.get(key) is None, "过期条目应失效"
+    for name in 'abc':
+        cache.put(cache.make_key(f'https://example.com/{name}', True), {'md_url': name})
+    assert len(cache.entries) == 2 and cache.make_key('https://example.com/a', True) not in cache.entries
+
+
+def test_single_flight_coalescing():
+    """相同 URL 的并发请求只转换一次，其中一个标记为 coalesced"""
+    calls = []
+
+    async def convert(url, download_media, on_stage=None):
+        calls.append(url)
+        await asyncio.sleep(0.05)
+        return fake_result(url)
+
+    async def run():
+        async with api_client(convert) as client:
+            responses = await asyncio.gather(*(
+                client.get('/api/convert', params={'url': 'https://example.com/same'}) for _ in range(3)
+            ))
+        return [response.json()['data'] for response in responses]
+
+    results = asyncio.run(run())
+    assert len(calls) == 1, calls
+    assert sum(result['coalesced'] for result in results) == 2
+    assert all(result['md_url'] == results[0]['md_url'] for result in results)
+
+
+def test_single_flight_stages():
+    """合并到同一次转换的请求都能收到转换的阶段，中途加入时先收到当前阶段"""
+    async def convert(url, download_media, on_stage=None):
+        on_stage("converting")
+        await asyncio.sleep(0.05)
+        on_stage("uploading")
+        await asyncio.sleep(0.02)
+        on_stage("saving")
+        return fake_result(url)
+
+    async def run():
+        owner, waiter = [], []
+        async with api_client(convert):
+            first = asyncio.create_task(api_service.run_conversion('https://example.com/s', False, owner.append))
+            await asyncio.sleep(0.02)
+            second = await api_service.run_conversion('https://example.com/s', False, waiter.append)
+            await first
+        return owner, waiter, second
+
+    owner, waiter, second = asyncio.run(run())
+    assert second['coalesced']
+    assert owner == ['converting', 'uploading', 'saving'], owner
+    assert waiter == ['converting', 'uploading', 'saving'], waiter
+    assert not api_service.single_flight.listeners and not api_service.single_flight.stages
+
+
+def test_single_flight_owner_cancelled():
+    """发起调用的请求被取消时，等待同一结果的其他请求不受影响"""
+    async def run():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def slow(notify):
+            await release.wait()
+            return 'done'
+
+        owner = asyncio.create_task(flight.run('key', slow))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(flight.run('key', slow))
+        await asyncio.sleep(0)
+        owner.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        result = await waiter
+        assert owner.cancelled()
+        return result, flight
+
+    (result, coalesced), flight = asyncio.run(run())
+    assert result == 'done' and coalesced
+    assert not flight.calls, "调用结束后应移除"
+
+
+def test_batch_ndjson():
+    """批量转换：每个 URL 输出一行 NDJSON，各主机轮流调度且不超过单主机并发数"""
+    active = {}
+    peak = {}
+
+    async def convert(url, download_media, on_stage=None):
+        host = url.split('/')[2]
+        active[host] = active.get(host, 0) + 1
+        peak[host] = max(peak.get(host, 0), active[host])
+        await asyncio.sleep(0.02)
+        active[host] -= 1
+        if url.endswith('/bad'):
+            raise ValueError('无法获取网页内容')
+        return fake_result(url)
+
+    urls = ['https://a.test/1', 'https://a.test/2', 'https://a.test/bad', 'https://b.test/1', 'https://b.test/2']
+
+    async def run():
+        limit, api_service.BATCH_PER_HOST_LIMIT = api_service.BATCH_PER_HOST_LIMIT, 1
+        try:
+            async with api_client(convert) as client:
+                response = await client.post('/api/convert/batch', json={'urls': urls, 'download_media': False})
+        finally:
+            api_service.BATCH_PER_HOST_LIMIT = limit
+        return response
+
+    response = asyncio.run(run())
+    assert response.headers['content-type'].startswith('application/x-ndjson')
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(line['index'] for line in lines) == list(range(len(urls)))
+    failed = [line for line in lines if not line['success']]
+    assert [line['url'] for line in failed] == ['https://a.test/bad'] and '无法获取网页内容' in failed[0]['error']
+    assert all(line['data']['md_url'] for line in lines if line['success'])
+    assert peak == {'a.test': 1, 'b.test': 1}, peak
+
+    # 各主机轮流取出；主机达到并发上限后等待它有转换完成
+    async def schedule():
+        queue = api_service.HostFairQueue(urls, per_host_limit=2)
+        order = [(await queue.next())[1] for _ in range(4)]
+        blocked = asyncio.ensure_future(queue.next())
+        await asyncio.sleep(0.01)
+        assert not blocked.done(), "a.test 已有 2 个转换进行中"
+        await queue.done('a.test')
+        return order, (await blocked)[1]
+
+    order, after_done = asyncio.run(schedule())
+    assert order == [0, 3, 1, 4], order
+    assert after_done == 2
+
+
+def main():
+    """主函数"""
+    tests = [
+        ("转换名额已满时返回 503", test_busy_returns_503),
+        ("进程池平分限速", test_offloaded_rate_limits),
+        ("异步任务与回调", test_jobs_and_callback),
+        ("只淘汰已结束的任务", test_job_retention),
+        ("按规范化 URL 缓存结果", test_result_cache),
+        ("相同 URL 的请求合并", test_single_flight_coalescing),
+        ("合并的请求同步转换阶段", test_single_flight_stages),
+        ("发起请求被取消时不影响等待者", test_single_flight_owner_cancelled),
+        ("批量转换（NDJSON）", test_batch_ndjson),
+    ]
+
+    print("=" * 60)
+    print("  HTML2MD API 服务测试")
+    print("=" * 60)
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✓ {name}")
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ {name}: {e}")
+        except Exception as e:
+            print(f"✗ {name}: {type(e).__name__}: {e}")
+
+    print("=" * 60)
+    print(f"通过: {passed}/{len(tests)}")
+    sys.exit(0 if passed == len(tests) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+启动耗时测试脚本
+用 python -X importtime 测量导入耗时，确保命令行和库导入不加载重依赖，可直接运行或使用 pytest
+"""
+
+import http.server
+import importlib.util
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# import html2md 的累计耗时上限（微秒）；当前约 1~2ms，留出余量应对较慢的机器
+IMPORT_BUDGET_US = 30000
+
+# 只在真正转换时才需要的依赖
+HEAVY_MODULES = ('requests', 'bs4', 'html2text', 'lxml', 'urllib3', 'argparse')
+
+
+def import_profile(*args, cwd=ROOT):
+    """以 -X importtime 运行 Python，返回 (退出码, {模块名: 累计耗时微秒})"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', *args],
+        cwd=cwd, capture_output=True, text=True, stdin=subprocess.DEVNULL
+    )
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return result.returncode, modules
+
+
+def test_import_budget():
+    """import html2md 不加载重依赖，且累计耗时在预算之内"""
+    code, modules = import_profile('-c', 'import html2md')
+    assert code == 0
+    loaded = [name for name in HEAVY_MODULES if name in modules]
+    assert not loaded, f"import html2md 加载了 {loaded}"
+    assert modules['html2md'] <= IMPORT_BUDGET_US, \
+        f"import html2md 耗时 {modules['html2md']}us，超出预算 {IMPORT_BUDGET_US}us"
+
+
+def test_cli_fast_paths():
+    """--help 和 --version 不加载转换所需的依赖"""
+    for flag in ('--help', '--version'):
+        code, modules = import_profile('html2md.py', flag)
+        assert code == 0, flag
+        loaded = [name for name in HEAVY_MODULES if name != 'argparse' and name in modules]
+        assert not loaded, f"html2md.py {flag} 加载了 {loaded}"
+
+
+def test_api_import_is_offline():
+    """导入 api_service 时不创建 Supabase 客户端，也不导入 supabase / httpx"""
+    if importlib.util.find_spec('fastapi') is None:
+        return  # 未安装 API 依赖时跳过
+    code, modules = import_profile('-c', 'import api_service')
+    assert code == 0
+    loaded = [name for name in ('supabase', 'httpx', 'html2md_async') if name in modules]
+    assert not loaded, f"import api_service 加载了 {loaded}"
+
+
+def test_daemon_forwarding():
+    """后台服务运行时，命令行把转换交给它执行，自身不导入转换依赖"""
+    if not hasattr(socket, 'AF_UNIX'):
+        return  # 不支持Unix套接字的系统跳过
+
+    page = '<html><head><title>守护进程</title></head><body><article><h1>守护进程</h1><p>正文</p></article></body></html>'
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = page.encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{httpd.server_address[1]}/post'
+
+    with tempfile.TemporaryDirectory() as workdir:
+        socket_path = os.path.join(workdir, 'html2md.sock')
+        daemon = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'html2md.py'), 'serve', '--socket', socket_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            for _ in range(100):
+                if os.path.exists(socket_path):
+                    break
+                time.sleep(0.05)
+            code, modules = import_profile(os.path.join(ROOT, 'html2md.py'), url,
+                                           '--socket', socket_path, cwd=workdir)
+            assert code == 0
+            assert os.path.exists(os.path.join(workdir, 'output', '守护进程.md')), "输出文件应写到客户端的工作目录"
+            loaded = [name for name in HEAVY_MODULES if name != 'argparse' and name in modules]
+            assert not loaded, f"转发给后台服务时客户端加载了 {loaded}"
+            assert os.stat(socket_path).st_mode & 0o077 == 0, "套接字只允许当前用户访问"
+
+            # 代码更新后（构建标识不同）后台服务拒绝请求，由客户端在本地转换
+            import html2md_daemon
+            build_id = html2md_daemon.build_id
+            html2md_daemon.build_id = lambda: 'stale'
+            try:
+                exit_code = html2md_daemon.forward({'urls': [url], 'output_dir': workdir}, socket_path)
+            finally:
+                html2md_daemon.build_id = build_id
+            assert exit_code is None, "构建标识不一致时应回退到本地转换"
+        finally:
+            daemon.terminate()
+            daemon.wait(timeout=10)
+            httpd.shutdown()
+        assert not os.path.exists(socket_path), "后台服务退出后应删除套接字文件"
+
+
+def test_daemon_rejects_foreign_socket():
+    """其他用户创建的同名套接字不会被当作后台服务"""
+    if not hasattr(socket, 'AF_UNIX') or not hasattr(os, 'getuid') or os.getuid() != 0:
+        return  # 需要 root 才能创建属于其他用户的套接字
+
+    from html2md_daemon import connect
+
+    with tempfile.TemporaryDirectory() as workdir:
+        socket_path = os.path.join(workdir, 'html2md.sock')
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(socket_path)
+        server.listen()
+        try:
+            os.chown(socket_path, 65534, 65534)
+            assert connect(socket_path) is None, "不应连接其他用户的套接字"
+        finally:
+            server.close()
+
+
+def main():
+    """主函数"""
+    tests = [
+        ("导入耗时预算", test_import_budget),
+        ("命令行快速路径", test_cli_fast_paths),
+        ("API 导入不连接 Supabase", test_api_import_is_offline),
+        ("后台服务转发", test_daemon_forwarding),
+        ("忽略其他用户的套接字", test_daemon_rejects_foreign_socket),
+    ]
+
+    print("=" * 60)
+    print("  HTML2MD 启动耗时测试")
+    print("=" * 60)
+
+    passed = 0
+    for name, test in tests:
+        try:
+            test()
+            print(f"✓ {name}")
+            passed += 1
+        except AssertionError as e:
+            print(f"✗ {name}: {e}")
+        except Exception as e:
+            print(f"✗ {name}: {type(e).__name__}: {e}")
+
+    print("=" * 60)
+    print(f"通过: {passed}/{len(tests)}")
+    sys.exit(0 if passed == len(tests) else 1)
+
+
+if __name__ == "__main__":
+    main()